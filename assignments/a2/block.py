@@ -22,11 +22,59 @@ Misha Schwartz, and Jaisie Sin
 This file contains the Block class, the main data structure used in the game.
 """
 from __future__ import annotations
-from typing import Optional, Tuple, List
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple, List
+import itertools
 import random
 import math
-
-from settings import colour_name, COLOUR_LIST
+import struct
+
+from settings import colour_name, colour_index, COLOUR_LIST, PALETTE
+
+# The (column, row) quadrant, in units of a child's size, of each child of a
+# Block: upper-right, upper-left, lower-left and lower-right.
+_QUADRANTS = [(1, 0), (0, 0), (0, 1), (1, 1)]
+# The inverse of _QUADRANTS: _CHILD_AT[column][row] is the index of the child
+# in that quadrant.
+_CHILD_AT = [[1, 2], [0, 3]]
+
+# The sides of a Block, as used by Block.side_counts.
+LEFT = 0
+RIGHT = 1
+TOP = 2
+BOTTOM = 3
+# The indices of the two children of a Block that lie along each side.
+_SIDE_CHILDREN = [(1, 2), (0, 3), (1, 0), (2, 3)]
+# After a clockwise quarter turn, side s of a Block shows what side
+# _TURNED_FROM[s] showed before.
+_TURNED_FROM = [BOTTOM, TOP, LEFT, RIGHT]
+
+# Random keys for hashing Block trees, Zobrist style. They come from their own
+# seeded generator so that hashes are the same in every run and building
+# them does not disturb the game's random numbers.
+_HASH_BITS = 64
+_HASH_MASK = (1 << _HASH_BITS) - 1
+_key_generator = random.Random(148)
+# The key of a leaf of each colour, by index in PALETTE. Keys for colours
+# added to PALETTE later are added by subtree_hash.
+_COLOUR_KEYS = [_key_generator.getrandbits(_HASH_BITS) for _ in PALETTE]
+# The key every Block with children starts from.
+_PARENT_KEY = _key_generator.getrandbits(_HASH_BITS)
+# An odd multiplier and a key for each child index, so that moving a subtree
+# to a different child index changes the hash.
+_CHILD_MULTIPLIERS = [_key_generator.getrandbits(_HASH_BITS) | 1
+                      for _ in range(4)]
+_CHILD_KEYS = [_key_generator.getrandbits(_HASH_BITS) for _ in range(4)]
+# The key of a leaf that has no colour yet, which no colour's key can be.
+_NO_COLOUR_KEY = _key_generator.getrandbits(_HASH_BITS)
+
+# The source of board versions. Every version handed out is new, so versions
+# of different boards never collide.
+_versions = itertools.count()
+
+# The header of a Block encoded by Block.to_bytes: the size in pixels, the
+# number of levels below the encoded Block, and the number of bits used for
+# each leaf's colour.
+_HEADER = struct.Struct('>HBB')
 
 
 def generate_board(max_depth: int, size: int) -> Block:
@@ -47,7 +95,474 @@ def generate_board(max_depth: int, size: int) -> Block:
     return board
 
 
-class Block:
+def _choose_move(parents: Sequence[Any], smashable: Sequence[Any],
+                 combinable: Sequence[Any], leaves: Dict[int, Sequence[Any]],
+                 colour: int, rng: Optional[random.Random]) -> \
+        Optional[Tuple[str, Optional[int], Any]]:
+    """Return a move chosen uniformly at random from the moves on the blocks
+    in <parents>, <smashable>, <combinable> and <leaves>, with paint moves
+    painting the colour at index <colour> in PALETTE, or None if there are no
+    such moves.
+
+    Each block in <parents> can be rotated either way and swapped either way,
+    and <leaves> holds the leaves at max_depth by the index of their colour,
+    as in _MoveIndex. Random numbers are drawn from <rng>, or from the random
+    module if <rng> is None.
+    """
+    painted = leaves.get(colour)
+    paintable = sum(len(same) for same in leaves.values()) - \
+        (0 if painted is None else len(painted))
+    total = 4 * len(parents) + len(smashable) + len(combinable) + paintable
+    if total == 0:
+        return None
+
+    i = random.randrange(total) if rng is None else rng.randrange(total)
+    if i < 4 * len(parents):
+        action, direction = [('rotate', 1), ('rotate', 3), ('swap', 0),
+                             ('swap', 1)][i % 4]
+        return action, direction, parents[i // 4]
+    i -= 4 * len(parents)
+    if i < len(smashable):
+        return 'smash', None, smashable[i]
+    i -= len(smashable)
+    if i < len(combinable):
+        return 'combine', None, combinable[i]
+    i -= len(combinable)
+    for key, same in leaves.items():
+        if key != colour:
+            if i < len(same):
+                return 'paint', None, same[i]
+            i -= len(same)
+
+    return None
+
+
+class _BoardState:
+    """The caches and records that only the root Block of a board keeps.
+
+    === Attributes ===
+    cells:
+        The cached grid of unit cells returned by Block.unit_cells(), or None
+        if it has not been built yet.
+    dirty:
+        The regions of <cells> that are out of date, each given as
+        (column, row, width) in unit cells.
+    journal:
+        One entry for each action made on the board since
+        Block.start_journal() was called, oldest first, or None if actions are
+        not being recorded. Each entry is (block, action, data, version),
+        where <data> is whatever Block.undo() needs to reverse the action and
+        <version> is the version the board had before it.
+    watchers:
+        The objects created by Block.cell_watcher(), by name.
+    moves:
+        The index of moves used by Block.random_move(), or None if it has not
+        been built yet.
+    version:
+        The value returned by Block.version().
+    summaries:
+        True iff Block.cache_summaries() has been called on the board.
+    """
+    cells: Optional[List[bytearray]]
+    dirty: List[Tuple[int, int, int]]
+    journal: Optional[List[Tuple[Block, str, Any, int]]]
+    watchers: Dict[str, Any]
+    moves: Optional[_MoveIndex]
+    version: int
+    summaries: bool
+
+    def __init__(self) -> None:
+        """Initialize an empty board state.
+        """
+        self.cells = None
+        self.dirty = []
+        self.journal = None
+        self.watchers = {}
+        self.moves = None
+        self.version = next(_versions)
+        self.summaries = False
+
+
+class _IndexedSet:
+    """A set of Blocks that can also be read like a list, so that a member can
+    be chosen at random in constant time. Blocks are told apart by identity,
+    since the hash of a Block changes with its colours.
+    """
+    # === Private Attributes ===
+    # _items:
+    #   The Blocks in this set, in no particular order.
+    # _positions:
+    #   The index in _items of each Block in this set, by id.
+    _items: List[Block]
+    _positions: Dict[int, int]
+
+    def __init__(self) -> None:
+        """Initialize an empty set.
+        """
+        self._items = []
+        self._positions = {}
+
+    def __len__(self) -> int:
+        """Return the number of Blocks in this set.
+        """
+        return len(self._items)
+
+    def __getitem__(self, index: int) -> Block:
+        """Return the Block at <index> in this set.
+        """
+        return self._items[index]
+
+    def add(self, block: Block) -> None:
+        """Add <block> to this set, if it is not in it already.
+        """
+        if id(block) not in self._positions:
+            self._positions[id(block)] = len(self._items)
+            self._items.append(block)
+
+    def discard(self, block: Block) -> None:
+        """Remove <block> from this set, if it is in it, by moving the last
+        Block into its place.
+        """
+        position = self._positions.pop(id(block), None)
+        if position is not None:
+            last = self._items.pop()
+            if last is not block:
+                self._items[position] = last
+                self._positions[id(last)] = position
+
+
+class _MoveIndex:
+    """The Blocks of a board that each kind of move can be made on.
+
+    Block._mark_changed updates the index after every action and undo, for
+    only the Blocks that the action changed, so that a valid move can be
+    drawn at random without searching the board.
+
+    === Attributes ===
+    parents:
+        The Blocks with children, which can be rotated and swapped.
+    smashable:
+        The leaves that can be smashed.
+    combinable:
+        The Blocks at level max_depth - 1 whose children have a majority
+        colour.
+    leaves:
+        The leaves at level max_depth, which can be painted, by the index in
+        PALETTE of their colour.
+    held:
+        True while updates are held back by Block.hold_moves().
+    """
+    parents: _IndexedSet
+    smashable: _IndexedSet
+    combinable: _IndexedSet
+    leaves: Dict[int, _IndexedSet]
+    held: bool
+    # === Private Attributes ===
+    # _leaf_colours:
+    #   The key in <leaves> of each Block in one of its sets, by id.
+    _leaf_colours: Dict[int, int]
+
+    def __init__(self, board: Block) -> None:
+        """Initialize an index of every Block in <board>.
+        """
+        self.parents = _IndexedSet()
+        self.smashable = _IndexedSet()
+        self.combinable = _IndexedSet()
+        self.leaves = {}
+        self.held = False
+        self._leaf_colours = {}
+        self._add_subtree(board)
+
+    def update(self, block: Block, removed: Optional[List[Block]]) -> None:
+        """Update this index for a change to <block>, which was given new
+        children in place of the children in <removed> if <removed> is not
+        None.
+        """
+        if self.held:
+            return
+        if removed is not None:
+            for child in removed:
+                self._remove_subtree(child)
+            for child in block.children:
+                self._add_subtree(child)
+        self._refresh(block)
+        if block._parent is not None:
+            # A paint can change the majority colour of the parent.
+            self._refresh(block._parent)
+
+    def choose(self, colour: int,
+               rng: Optional[random.Random] = None) -> \
+            Optional[Tuple[str, Optional[int], Block]]:
+        """Return a move chosen uniformly at random from all the moves in this
+        index, with paint moves painting the colour at index <colour> in
+        PALETTE, or None if there are no such moves.
+
+        Random numbers are drawn from <rng>, or from the random module if
+        <rng> is None.
+        """
+        return _choose_move(self.parents, self.smashable, self.combinable,
+                            self.leaves, colour, rng)
+
+    # helper
+    def _add_subtree(self, block: Block) -> None:
+        """Add <block> and its descendants to this index.
+        """
+        stack = [block]
+        while stack != []:
+            block = stack.pop()
+            for child in block.children:
+                if child._parent is None:
+                    child._parent = block
+                stack.append(child)
+            self._refresh(block)
+
+    # helper
+    def _remove_subtree(self, block: Block) -> None:
+        """Remove <block> and its descendants from this index.
+        """
+        stack = [block]
+        while stack != []:
+            block = stack.pop()
+            stack.extend(block.children)
+            self._discard(block)
+
+    # helper
+    def _refresh(self, block: Block) -> None:
+        """Put <block> in the sets of this index it now belongs in, and take
+        it out of the others.
+        """
+        self._discard(block)
+        if block.children != []:
+            self.parents.add(block)
+            if block.level == block.max_depth - 1 and \
+                    block._get_majority_color() is not None:
+                self.combinable.add(block)
+        elif block.level != block.max_depth:
+            self.smashable.add(block)
+        else:
+            if block._colour not in self.leaves:
+                self.leaves[block._colour] = _IndexedSet()
+            self.leaves[block._colour].add(block)
+            self._leaf_colours[id(block)] = block._colour
+
+    # helper
+    def _discard(self, block: Block) -> None:
+        """Remove <block> from every set in this index.
+        """
+        self.parents.discard(block)
+        self.smashable.discard(block)
+        self.combinable.discard(block)
+        key = self._leaf_colours.pop(id(block), None)
+        if key is not None:
+            self.leaves[key].discard(block)
+
+
+class BlockBase:
+    """The methods shared by Block and quadtree.QuadtreeBlock.
+
+    They only read the public attributes of a Block (position, size, colour,
+    level, max_depth and children), _child_size(), and the helpers below
+    that each subclass defines, so they work the same on both.
+    """
+    __slots__ = ()
+    position: Tuple[int, int]
+    size: int
+    level: int
+    max_depth: int
+    children: List[BlockBase]
+
+    def _child_size(self) -> int:
+        """Return the size of this block's children.
+        """
+        raise NotImplementedError
+
+    def _colour_key(self) -> int:
+        """Return the index in PALETTE of this leaf's colour.
+        """
+        raise NotImplementedError
+
+    def _one_colour(self) -> bool:
+        """Return True iff every unit cell of this block is the same colour.
+        """
+        raise NotImplementedError
+
+    def _same_as(self, other: BlockBase) -> bool:
+        """Return True iff this block and <other>, a block of the same class,
+        have the same unit cells.
+        """
+        raise NotImplementedError
+
+    def _majority_key(self) -> Optional[int]:
+        """Return the index in PALETTE of the majority colour of this block's
+        children, or None if there is no majority colour.
+        """
+        raise NotImplementedError
+
+    def locate(self, location: Tuple[int, int], level: int) -> \
+            Optional[BlockBase]:
+        """Return the block within this block that is at <level> and includes
+        <location>, as player._get_block does.
+
+        The child to descend into is computed from the coordinates, so this
+        takes time proportional to the depth of the tree.
+
+        >>> board = Block((0, 0), 750, None, 0, 2)
+        >>> board.smash()
+        True
+        >>> board.locate((500, 100), 1) is board.children[0]
+        True
+        >>> board.locate((750, 0), 1) is None
+        True
+        """
+        x, y = self.position
+        loc_x, loc_y = location
+        block = self
+        while block.level < level:
+            children = block.children
+            if children == []:
+                break
+            size = block._child_size()
+            column = 1 if loc_x >= x + size else 0
+            row = 1 if loc_y >= y + size else 0
+            x += column * size
+            y += row * size
+            if not (x <= loc_x < x + size and y <= loc_y < y + size):
+                return None
+            block = children[_CHILD_AT[column][row]]
+
+        if block is self and not (x <= loc_x < x + self.size and
+                                  y <= loc_y < y + self.size):
+            return None
+        return block
+
+    def locate_all(self, queries: List[Tuple[Tuple[int, int], int]]) -> \
+            List[Optional[BlockBase]]:
+        """Return the result of locate(location, level) for each
+        (location, level) in <queries>, in the same order.
+
+        All the queries descend the tree together, so each block on the way is
+        visited once no matter how many queries pass through it.
+
+        >>> board = Block((0, 0), 750, None, 0, 1)
+        >>> board.smash()
+        True
+        >>> board.locate_all([((0, 0), 1), ((0, 0), 0), ((-1, 0), 1)]) == \\
+        ...     [board.children[1], board, None]
+        True
+        """
+        results = [None] * len(queries)
+        x, y = self.position
+        stack = [(self, x, y, list(range(len(queries))))]
+        while stack:
+            block, x, y, pending = stack.pop()
+            children = block.children
+            size = block._child_size()
+            groups = [[], [], [], []]
+            for i in pending:
+                (loc_x, loc_y), level = queries[i]
+                if children == [] or block.level >= level:
+                    # Queries reach any other Block only if they lie in it.
+                    if block is not self or \
+                            (x <= loc_x < x + block.size and
+                             y <= loc_y < y + block.size):
+                        results[i] = block
+                    continue
+                column = 1 if loc_x >= x + size else 0
+                row = 1 if loc_y >= y + size else 0
+                if x + column * size <= loc_x < x + (column + 1) * size and \
+                        y + row * size <= loc_y < y + (row + 1) * size:
+                    groups[_CHILD_AT[column][row]].append(i)
+            for j in range(4):
+                if groups[j]:
+                    column, row = _QUADRANTS[j]
+                    stack.append((children[j], x + column * size,
+                                  y + row * size, groups[j]))
+
+        return results
+
+    def valid_moves(self, colour: Tuple[int, int, int]) -> \
+            List[Tuple[str, Optional[int], BlockBase]]:
+        """Return every move other than PASS that can be made on this block or
+        one of its descendants, in the format returned by
+        Player.generate_move, with paint moves painting <colour>.
+
+        The moves are found from the structure of the tree without trying
+        them. Rotates and swaps that would leave the unit cells as they are
+        are left out: those of a block whose unit cells are all one colour,
+        and swaps of children that are the same pairwise.
+
+        >>> board = Block((0, 0), 750, COLOUR_LIST[0], 0, 1)
+        >>> [move[0] for move in board.valid_moves(COLOUR_LIST[0])]
+        ['smash']
+        >>> board = Block((0, 0), 750, COLOUR_LIST[0], 0, 0)
+        >>> board.valid_moves(COLOUR_LIST[0])
+        []
+        """
+        index = colour_index(colour)
+        moves = []
+        stack = [self]
+        while stack != []:
+            block = stack.pop()
+            children = block.children
+            if children == []:
+                if block.level != block.max_depth:
+                    moves.append(('smash', None, block))
+                elif block._colour_key() != index:
+                    moves.append(('paint', None, block))
+                continue
+
+            if not block._one_colour():
+                moves.append(('rotate', 1, block))
+                moves.append(('rotate', 3, block))
+                if not children[0]._same_as(children[1]) or \
+                        not children[2]._same_as(children[3]):
+                    moves.append(('swap', 0, block))
+                if not children[0]._same_as(children[3]) or \
+                        not children[1]._same_as(children[2]):
+                    moves.append(('swap', 1, block))
+            if block.level == block.max_depth - 1 and \
+                    block._majority_key() is not None:
+                moves.append(('combine', None, block))
+
+            stack.extend(reversed(children))
+
+        return moves
+
+    def random_move(self, colour: Tuple[int, int, int],
+                    rng: Optional[random.Random] = None) -> \
+            Optional[Tuple[str, Optional[int], BlockBase]]:
+        """Return a move chosen at random, with paint moves painting <colour>,
+        or None if there are no moves other than PASS.
+
+        Moves are drawn the same way as Block.random_move draws them, but
+        from a list of the blocks each kind of move can be made on that is
+        made again on every call. Random numbers are drawn from <rng>, or
+        from the random module if <rng> is None.
+        """
+        parents = []
+        smashable = []
+        combinable = []
+        leaves = {}
+        stack = [self]
+        while stack != []:
+            block = stack.pop()
+            children = block.children
+            if children != []:
+                parents.append(block)
+                if block.level == block.max_depth - 1 and \
+                        block._majority_key() is not None:
+                    combinable.append(block)
+                stack.extend(reversed(children))
+            elif block.level != block.max_depth:
+                smashable.append(block)
+            else:
+                leaves.setdefault(block._colour_key(), []).append(block)
+
+        return _choose_move(parents, smashable, combinable, leaves,
+                            colour_index(colour), rng)
+
+
+class Block(BlockBase):
     """A square Block in the Blocky game, represented as a tree.
 
     In addition to its tree-related attributes, a Block also contains attributes
@@ -92,12 +607,66 @@ class Block:
         - its colour is not None.
     - level <= max_depth
     """
-    position: Tuple[int, int]
+    # === Private Attributes ===
+    # _colour:
+    #   The index in settings.PALETTE of this Block's colour, or None if it
+    #   has children. Colours are stored as small ints so that every Block is
+    #   the same size whatever the palette is, and comparing two colours is a
+    #   comparison of ints. The RGB value is only looked up when <colour> is
+    #   read, for example when the board is drawn.
+    # _position:
+    #   The position of this Block if it is not linked to a parent. The
+    #   position of a linked Block is worked out from its ancestors instead.
+    # _children:
+    #   The children of this Block, not yet rearranged for _rotation.
+    # _rotation:
+    #   The number of clockwise quarter turns that have been applied to this
+    #   Block's subtree but not yet passed on to its children. They are
+    #   passed on the next time the children are read, so rotating a Block
+    #   costs O(1) no matter how big its subtree is.
+    # _parent:
+    #   The Block that has this Block as a child, or None if this Block is the
+    #   root of its tree or has not been linked to its parent yet. A Block
+    #   shared by boards made with after_move stays linked to its parent in
+    #   the board it was made for.
+    # _borrowed:
+    #   True iff _children are still the Blocks this Block was copied from by
+    #   _moved_copy, which belong to another board. They are copied into this
+    #   Block's board the first time they are read.
+    # _hash:
+    #   The value returned by subtree_hash(), or None if it has not been
+    #   computed since this Block or one of its descendants last changed.
+    # _sides:
+    #   The value returned by side_counts(side) for each side, or None in
+    #   place of a side that has not been counted since this Block or one of
+    #   its descendants last changed. None if no side has been counted, and
+    #   always None unless the board caches its summaries.
+    # _areas:
+    #   The value returned by area_summary(), or None if it has not been
+    #   computed since this Block or one of its descendants last changed.
+    #   Always None unless the board caches its summaries.
+    # _state:
+    #   Only used by the root of a tree: its caches and records, or None if
+    #   nothing has needed them yet.
+    #
+    # Blocks use __slots__, so there is no per-Block __dict__ and any new
+    # attribute must be added to the list below.
+    __slots__ = ('size', 'level', 'max_depth', '_colour', '_position',
+                 '_children', '_rotation', '_parent', '_borrowed', '_hash',
+                 '_sides', '_areas', '_state')
     size: int
-    colour: Optional[Tuple[int, int, int]]
     level: int
     max_depth: int
-    children: List[Block]
+    _colour: Optional[int]
+    _position: Tuple[int, int]
+    _children: List[Block]
+    _rotation: int
+    _parent: Optional[Block]
+    _borrowed: bool
+    _hash: Optional[int]
+    _sides: Optional[List[Optional[Dict[int, int]]]]
+    _areas: Optional[Tuple[Dict[int, int], int]]
+    _state: Optional[_BoardState]
 
     def __init__(self, position: Tuple[int, int], size: int,
                  colour: Optional[Tuple[int, int, int]], level: int,
@@ -111,19 +680,82 @@ class Block:
             - level >= 0
             - max_depth >= level
         """
-        self.position = position
+        self._position = position
         self.size = size
         self.colour = colour
         self.level = level
         self.max_depth = max_depth
-        self.children = []
+        self._children = []
+        self._rotation = 0
+        self._parent = None
+        self._borrowed = False
+        self._hash = None
+        self._sides = None
+        self._areas = None
+        self._state = None
+
+    @property
+    def position(self) -> Tuple[int, int]:
+        """The (x, y) coordinates of the upper left corner of this Block.
+
+        The position of a Block that is linked to its parent is worked out from
+        the position of the root and the child indices leading down to it, so
+        it never has to be rewritten when an ancestor is rotated or swapped.
+        """
+        ancestors = self._ancestors()
+        if ancestors == []:
+            return self._position
+
+        x, y = ancestors[0]._position
+        for parent, child in zip(ancestors, ancestors[1:] + [self]):
+            size = parent._child_size()
+            quadrant = _QUADRANTS[parent._child_index(child)]
+            x += quadrant[0] * size
+            y += quadrant[1] * size
+
+        return x, y
+
+    @position.setter
+    def position(self, position: Tuple[int, int]) -> None:
+        self._position = position
+
+    @property
+    def colour(self) -> Optional[Tuple[int, int, int]]:
+        """The colour of this Block, or None if it has children.
+        """
+        if self._colour is None:
+            return None
+        return PALETTE[self._colour]
+
+    @colour.setter
+    def colour(self, colour: Optional[Tuple[int, int, int]]) -> None:
+        if colour is None:
+            self._colour = None
+        else:
+            self._colour = colour_index(colour)
+
+    @property
+    def children(self) -> List[Block]:
+        """The children of this Block, in the order described above.
+        """
+        if self._borrowed:
+            self._adopt_children()
+        if self._rotation != 0:
+            self._apply_rotation()
+        return self._children
+
+    @children.setter
+    def children(self, children: List[Block]) -> None:
+        self._children = children
+        self._rotation = 0
+        self._borrowed = False
 
     def __str__(self) -> str:
         """Return this Block in a string format.
 
-        >>> block = Block((0, 0), 750, (0, 0, 0), 0, 1)
+        >>> block = Block((0, 0), 750, COLOUR_LIST[0], 0, 1)
         >>> str(block)
-        'Leaf: colour=Black, pos=(0, 0), size=750, level=0\\n'
+        'Leaf: colour=Pacific Point, pos=(0, 0), size=750, level=0\\n'
         """
         if len(self.children) == 0:
             indents = '\t' * self.level
@@ -144,6 +776,11 @@ class Block:
         """Return True iff this Block and all its descendents are equivalent to
         the <other> Block and all its descendents.
         """
+        if isinstance(other, Block) and \
+                self.subtree_hash() != other.subtree_hash():
+            # Different colours or structure, whatever the positions are.
+            return False
+
         if len(self.children) == 0 and len(other.children) == 0:
             # Both self and other are leaves.
             return self.position == other.position and \
@@ -163,6 +800,165 @@ class Block:
 
             return True
 
+    def __hash__(self) -> int:
+        """Return a hash of this Block based on its subtree_hash.
+
+        A Block is mutable, so a Block used as a dictionary key must not be
+        changed while it is in the dictionary.
+        """
+        return self.subtree_hash()
+
+    def subtree_hash(self) -> int:
+        """Return a hash of the colours and structure of this Block and its
+        descendants.
+
+        The hash does not depend on where this Block is or at what level, so
+        two Blocks whose subtrees look the same have the same hash even if
+        they are in different places. Hashes are cached, and an action only
+        clears the cached hashes of the Blocks it changed and of their
+        ancestors, so hashing a board again after an action recomputes only
+        those. Like unit_cells, this relies on the tree only being changed
+        through the methods of Block once hashes have been computed.
+
+        >>> b1 = Block((0, 0), 750, COLOUR_LIST[0], 0, 1)
+        >>> b2 = Block((375, 375), 375, COLOUR_LIST[0], 1, 1)
+        >>> b1.subtree_hash() == b2.subtree_hash()
+        True
+        """
+        if self._hash is None:
+            if self.children == []:
+                # Blocks being set up by hand may not have a colour yet.
+                colour = self._colour
+                if colour is None:
+                    self._hash = _NO_COLOUR_KEY
+                else:
+                    while len(_COLOUR_KEYS) <= colour:
+                        _COLOUR_KEYS.append(
+                            _key_generator.getrandbits(_HASH_BITS))
+                    self._hash = _COLOUR_KEYS[colour]
+            else:
+                value = _PARENT_KEY
+                for i in range(4):
+                    if self.children[i]._parent is None:
+                        self.children[i]._parent = self
+                    child_hash = self.children[i].subtree_hash() ^ \
+                        _CHILD_KEYS[i]
+                    value ^= (child_hash * _CHILD_MULTIPLIERS[i]) & _HASH_MASK
+                self._hash = value
+
+        return self._hash
+
+    def side_counts(self, side: int) -> Dict[int, int]:
+        """Return how many of the unit cells along <side> of this Block are of
+        each colour, as a dictionary from the index of a colour in PALETTE to
+        a number of unit cells. The returned dictionary must not be mutated.
+
+        <side> is one of LEFT, RIGHT, TOP and BOTTOM. Only the descendants
+        that touch <side> are visited. On a board that cache_summaries() was
+        called on, the counts are cached like subtree_hash, so counting again
+        after an action only revisits the Blocks it changed and their
+        ancestors.
+
+        >>> board = Block((0, 0), 750, None, 0, 1)
+        >>> colours = [COLOUR_LIST[0], COLOUR_LIST[1], COLOUR_LIST[1],
+        ...            COLOUR_LIST[2]]
+        >>> board.children = [Block((0, 0), 375, c, 1, 1) for c in colours]
+        >>> board.side_counts(LEFT)
+        {1: 2}
+        >>> board.side_counts(TOP)
+        {1: 1, 0: 1}
+        """
+        return self._side_counts(side, self._caches_summaries())
+
+    # helper
+    def _side_counts(self, side: int, cache: bool) -> Dict[int, int]:
+        """Return side_counts(side), keeping the counts of this Block and its
+        descendants cached iff <cache> is True.
+        """
+        counts = None if self._sides is None else self._sides[side]
+        if counts is None:
+            children = self.children
+            if children == []:
+                counts = {self._colour: 2 ** (self.max_depth - self.level)}
+            else:
+                counts = {}
+                for i in _SIDE_CHILDREN[side]:
+                    if children[i]._parent is None:
+                        children[i]._parent = self
+                    child_counts = children[i]._side_counts(side, cache)
+                    for colour, count in child_counts.items():
+                        counts[colour] = counts.get(colour, 0) + count
+            if cache:
+                if self._sides is None:
+                    self._sides = [None, None, None, None]
+                self._sides[side] = counts
+
+        return counts
+
+    def area_summary(self) -> Tuple[Dict[int, int], int]:
+        """Return a dictionary from the index in PALETTE of each colour in
+        this Block to the number of unit cells of that colour, and the number
+        of unit cells in the largest leaf of this Block that can be smashed,
+        or 0 if no leaf can be. The returned dictionary must not be mutated.
+
+        The summary is cached like side_counts.
+
+        >>> board = Block((0, 0), 750, COLOUR_LIST[2], 0, 2)
+        >>> board.area_summary()
+        ({2: 16}, 16)
+        """
+        return self._area_summary(self._caches_summaries())
+
+    # helper
+    def _area_summary(self, cache: bool) -> Tuple[Dict[int, int], int]:
+        """Return area_summary(), keeping the summaries of this Block and its
+        descendants cached iff <cache> is True.
+        """
+        summary = self._areas
+        if summary is None:
+            children = self.children
+            if children == []:
+                area = 4 ** (self.max_depth - self.level)
+                smashable = area if self.level < self.max_depth else 0
+                summary = ({self._colour: area}, smashable)
+            else:
+                areas = {}
+                smashable = 0
+                for child in children:
+                    if child._parent is None:
+                        child._parent = self
+                    child_areas, child_smashable = child._area_summary(cache)
+                    for colour, area in child_areas.items():
+                        areas[colour] = areas.get(colour, 0) + area
+                    smashable = max(smashable, child_smashable)
+                summary = (areas, smashable)
+            if cache:
+                self._areas = summary
+
+        return summary
+
+    def cache_summaries(self) -> None:
+        """Keep the results of side_counts() and area_summary() cached on the
+        Blocks of this board from now on.
+
+        Each action then only clears the summaries of the Blocks it changed
+        and of their ancestors. This pays off for a board that is changed and
+        scored over and over, like the board of a game, at the cost of a few
+        dictionaries for every Block.
+
+        Precondition: this Block is the root of its board.
+        """
+        self._board_state().summaries = True
+
+    # helper
+    def _caches_summaries(self) -> bool:
+        """Return whether cache_summaries() has been called on the board this
+        Block is in.
+        """
+        ancestors = self._ancestors()
+        root = ancestors[0] if ancestors != [] else self
+        return root._state is not None and root._state.summaries
+
     def _child_size(self) -> int:
         """Return the size of this Block's children.
         """
@@ -188,15 +984,10 @@ class Block:
         Block.
         """
         # TODO: Implement me
-        if self.children == []:  # no children
-            self.position = position
-        else:
-            self.position = position
-            lst_positions = self._children_positions()
-            i = 0
-            for child in self.children:  # each child is a Block
-                child._update_children_positions(lst_positions[i])
-                i += 1
+        # Descendants work out their positions from this Block's, so they only
+        # need to be linked to it.
+        self.position = position
+        self._link_descendants()
 
     def smashable(self) -> bool:
         """Return True iff this block can be smashed.
@@ -219,11 +1010,24 @@ class Block:
         if not self.smashable():
             return False
 
+        colour = self._colour
+        self._subdivide()
+        self._mark_changed(('smash', (colour, self.children[:])), [])
+
+        return True
+
+    # helper
+    def _subdivide(self) -> None:
+        """Give this Block four randomly coloured children, and randomly
+        subdivide each of them in turn.
+
+        Precondition: self.smashable()
+        """
         # __init__(self, position: Tuple[int, int], size: int,
         #                  colour: Optional[Tuple[int, int, int]], level: int,
         #                  max_depth: int) -> None:
 
-        self.colour = None
+        self._colour = None
         lst_positions = self._children_positions()
         child_size = self._child_size()
         child_level = self.level + 1
@@ -235,10 +1039,13 @@ class Block:
 
         for child in self.children:
             num = random.random()
-            if num < math.exp(-0.25 * child.level):
-                child.smash()
+            if num < math.exp(-0.25 * child.level) and child.smashable():
+                child._subdivide()
 
-        return True
+        # Link the children last, so that while they are subdivided they can
+        # read their own position directly.
+        for child in self.children:
+            child._parent = self
 
     def swap(self, direction: int) -> bool:
         """Swap the child Blocks of this Block.
@@ -254,6 +1061,22 @@ class Block:
         # question: is it just the children or all?
         if self.children == []:
             return False
+
+        self._link_children()
+        self._ancestors()
+        self._swap_children(direction)
+        self._mark_changed(('swap', direction))
+        return True
+
+    # helper
+    def _swap_children(self, direction: int) -> None:
+        """Swap the children of this Block in <direction>, as described in
+        swap.
+
+        A swap and a rotation do not commute, so any rotation that this
+        Block's ancestors have not passed on yet must already have been
+        applied, for example by calling _ancestors().
+        """
         zero = self.children[0]
         one = self.children[1]
         two = self.children[2]
@@ -271,8 +1094,6 @@ class Block:
             self.children[2] = three
             self.children[3] = two
 
-        return True
-
     def rotate(self, direction: int) -> bool:
         """Rotate this Block and all its descendants.
 
@@ -288,43 +1109,82 @@ class Block:
             return False
 
         else:
-            if direction == 1:  # rotate clockwise
-                self._rotate_clockwise()
-            if direction == 3:  # rotate counter clockwise
-                self._rotate_counterclock()
-
-            for child in self.children:
-                child.rotate(direction)
+            self._link_children()
+            self._rotate_subtree(direction)
+            self._mark_changed(('rotate', direction))
 
             return True
 
+    # helper
+    def _rotate_subtree(self, direction: int) -> None:
+        """Rotate the children of this Block and of all its descendants in
+        <direction>, as described in rotate.
+
+        The rotation is only recorded here, in O(1). Each Block passes it on to
+        its children when they are next read.
+        """
+        if self._children != []:
+            self._hash = None
+            self._turn_sides(direction)
+            self._rotation = (self._rotation + direction) % 4
+
+    # helper
+    def _apply_rotation(self) -> None:
+        """Rearrange the children of this Block for the quarter turns in
+        _rotation, and pass the turns on to each child's own subtree.
+        """
+        turns = self._rotation
+        self._rotation = 0
+        if turns == 1:
+            self._rotate_clockwise()
+        elif turns == 2:
+            self._rotate_clockwise()
+            self._rotate_clockwise()
+        elif turns == 3:
+            self._rotate_counterclock()
+
+        for child in self._children:
+            if child._children != []:
+                child._rotation = (child._rotation + turns) % 4
+                child._hash = None
+                child._turn_sides(turns)
+
+    # helper
+    def _turn_sides(self, turns: int) -> None:
+        """Move the cached side counts of this Block to where its sides will
+        be after <turns> clockwise quarter turns.
+        """
+        if self._sides is not None:
+            for _ in range(turns):
+                self._sides = [self._sides[side] for side in _TURNED_FROM]
+
     # helper
     def _rotate_clockwise(self) -> None:
         """ Rotate the children of this Block clockwise.
         """
-        zero = self.children[0]
-        one = self.children[1]
-        two = self.children[2]
-        three = self.children[3]
+        zero = self._children[0]
+        one = self._children[1]
+        two = self._children[2]
+        three = self._children[3]
 
-        self.children[0] = one
-        self.children[1] = two
-        self.children[2] = three
-        self.children[3] = zero
+        self._children[0] = one
+        self._children[1] = two
+        self._children[2] = three
+        self._children[3] = zero
 
     # helper
     def _rotate_counterclock(self) -> None:
         """ Rotate the children of this Block clockwise.
         """
-        zero = self.children[0]
-        one = self.children[1]
-        two = self.children[2]
-        three = self.children[3]
+        zero = self._children[0]
+        one = self._children[1]
+        two = self._children[2]
+        three = self._children[3]
 
-        self.children[0] = three
-        self.children[1] = zero
-        self.children[2] = one
-        self.children[3] = two
+        self._children[0] = three
+        self._children[1] = zero
+        self._children[2] = one
+        self._children[3] = two
 
     def paint(self, colour: Tuple[int, int, int]) -> bool:
         """Change this Block's colour iff it is a leaf at a level of max_depth
@@ -333,8 +1193,11 @@ class Block:
         Return True iff this Block's colour was changed.
         """
         # TODO: Implement me
-        if self.level == self.max_depth and self.colour != colour:
-            self.colour = colour
+        index = colour_index(colour)
+        if self.level == self.max_depth and self._colour != index:
+            old_colour = self._colour
+            self._colour = index
+            self._mark_changed(('paint', old_colour))
             return True
 
         return False
@@ -358,29 +1221,36 @@ class Block:
 
         maj_color = self._get_majority_color()
         if maj_color is not None:
+            # Pass on the rotations of the ancestors first, so that undo can
+            # put back the children just as they are now.
+            self._ancestors()
+            children = self.children
+            for child in children:
+                child._parent = None
             self.children = []
-            self.colour = maj_color
+            self._colour = maj_color
+            self._mark_changed(('combine', children), children)
             return True
 
         return False
 
     # helper
-    def _get_majority_color(self) -> Optional[Tuple[int, int, int]]:
-        """Return the majority color of this Block, if it exists. Return None
-        if it doesn't exist.
+    def _get_majority_color(self) -> Optional[int]:
+        """Return the index in settings.PALETTE of the majority color of this
+        Block, if it exists. Return None if it doesn't exist.
 
         Precondition: self.level == self.max_depth - 1 and self.children != []:
         """
         lst_colors = []  # all child colors; but no duplicate color in lst
         for child in self.children:
-            if child.colour not in lst_colors:
-                lst_colors.append(child.colour)
+            if child._colour not in lst_colors:
+                lst_colors.append(child._colour)
 
         color_count = []  # len(color_count) == len(lst_colors)
         for color in lst_colors:
             count = 0
             for child in self.children:
-                if child.colour == color:
+                if child._colour == color:
                     count += 1
             color_count.append(count)
 
@@ -391,6 +1261,87 @@ class Block:
 
         return None
 
+    # helper
+    def _colour_key(self) -> int:
+        """Return the index in settings.PALETTE of this leaf's colour.
+        """
+        return self._colour
+
+    # helper
+    def _one_colour(self) -> bool:
+        """Return True iff every unit cell of this Block is the same colour.
+        """
+        summary = self._areas
+        if summary is None:
+            summary = self._area_summary(self._caches_summaries())
+        return len(summary[0]) == 1
+
+    # helper
+    def _same_as(self, other: Block) -> bool:
+        """Return True iff this Block and <other> have the same subtree hash.
+        """
+        return self.subtree_hash() == other.subtree_hash()
+
+    # helper
+    def _majority_key(self) -> Optional[int]:
+        """Return the index in settings.PALETTE of the majority colour of this
+        Block's children, or None if there is none.
+        """
+        return self._get_majority_color()
+
+    def random_move(self, colour: Tuple[int, int, int],
+                    rng: Optional[random.Random] = None) -> \
+            Optional[Tuple[str, Optional[int], Block]]:
+        """Return a move chosen uniformly at random from all the moves other
+        than PASS that can be made on this board, with paint moves painting
+        <colour>, or None if there are none.
+
+        The first call builds an index of the Blocks each kind of move can be
+        made on, and every action and undo after that updates it for the
+        Blocks it changed, so later calls take constant time. Like
+        unit_cells, this relies on the tree only being changed through the
+        methods of Block. Random numbers are drawn from <rng>, or from the
+        random module if <rng> is None.
+
+        >>> board = Block((0, 0), 750, COLOUR_LIST[0], 0, 1)
+        >>> board.random_move(COLOUR_LIST[0])[:2]
+        ('smash', None)
+
+        Precondition: this Block is the root of its board.
+        """
+        state = self._board_state()
+        if state.moves is None:
+            state.moves = _MoveIndex(self)
+
+        return state.moves.choose(colour_index(colour), rng)
+
+    def hold_moves(self) -> None:
+        """Stop updating the index of moves used by random_move() until
+        release_moves() is called.
+
+        This is for trying out actions that are all undone before
+        release_moves() is called, such as the moves a player is choosing
+        between. The Blocks in the index are then the same as before, and
+        they are left in the same order, so random_move() goes on making the
+        same choices as if the actions had never been made. random_move()
+        must not be called in between.
+
+        Precondition: this Block is the root of its board.
+        """
+        state = self._board_state()
+        if state.moves is not None:
+            state.moves.held = True
+
+    def release_moves(self) -> None:
+        """Start updating the index of moves used by random_move() again, as
+        described in hold_moves().
+
+        Precondition: this Block is the root of its board.
+        """
+        state = self._board_state()
+        if state.moves is not None:
+            state.moves.held = False
+
     def create_copy(self) -> Block:
         """Return a new Block that is a deep copy of this Block.
 
@@ -401,17 +1352,637 @@ class Block:
         #                  colour: Optional[Tuple[int, int, int]], level: int,
         #                  max_depth: int) -> None:
 
-        block = Block(self.position, self.size, self.colour, self.level,
-                      self.max_depth)
+        return self._copy_at(self.position)
+
+    # helper
+    def _copy_at(self, position: Tuple[int, int]) -> Block:
+        """Return a new Block that is a deep copy of this Block, with its upper
+        left corner at <position>.
+        """
+        block = Block(position, self.size, None, self.level, self.max_depth)
+        block._colour = self._colour
+        block._hash = self._hash
+        if self._sides is not None:
+            block._sides = self._sides[:]
+        block._areas = self._areas
 
         if self.children == []:
             return block
         else:
-            for child in self.children:
-                block.children.append(child.create_copy())
+            # <block> is not linked to a parent yet, so reading its position
+            # here is O(1).
+            lst_positions = block._children_positions()
+            for i in range(4):
+                child_copy = self.children[i]._copy_at(lst_positions[i])
+                child_copy._parent = block
+                block.children.append(child_copy)
 
             return block
 
+    def to_bytes(self) -> bytes:
+        """Return this Block and its descendants encoded as bytes.
+
+        After a short header, the tree is written in preorder, most significant
+        bit first: a 1 bit for a Block with children, or a 0 bit followed by
+        the index of the colour in PALETTE for a leaf. The colour takes 2 bits
+        while the leaves only use the default four colours, and otherwise as
+        many as the largest index they use needs, so the same board always
+        gives the same bytes. The width is stored in the header. The last
+        byte is padded with 0 bits.
+
+        >>> board = Block((0, 0), 750, None, 0, 1)
+        >>> board.smash()
+        True
+        >>> data = board.to_bytes()
+        >>> Block.from_bytes(data) == board
+        True
+        """
+        # Each parent is listed as None and each leaf as its colour, so that
+        # the width of the colours is known before any of them is written.
+        tokens = []
+        stack = [self]
+        while stack:
+            block = stack.pop()
+            children = block.children
+            if children:
+                tokens.append(None)
+                stack.extend(reversed(children))
+            else:
+                tokens.append(block._colour)
+        largest = max((token for token in tokens if token is not None),
+                      default=0)
+        bits = max(2, largest.bit_length())
+
+        data = bytearray(_HEADER.pack(self.size, self.max_depth - self.level,
+                                      bits))
+        value = 0
+        count = 0
+        for token in tokens:
+            if token is None:
+                value = value << 1 | 1
+                count += 1
+            else:
+                value = (value << (bits + 1)) | token
+                count += bits + 1
+            # Keep <value> small by moving whole bytes out of it.
+            while count >= 8:
+                count -= 8
+                data.append(value >> count)
+                value &= (1 << count) - 1
+        if count > 0:
+            data.append(value << (8 - count))
+
+        return bytes(data)
+
+    @staticmethod
+    def from_bytes(data: bytes,
+                   palette: Optional[List[Tuple[int, int, int]]] = None) -> \
+            Block:
+        """Return a new board decoded from <data>, in the format returned by
+        to_bytes.
+
+        <palette> is PALETTE as it was in the program that encoded <data>. It
+        is only needed if that was another program, such as another process,
+        and the board may use colours other than the default ones.
+
+        The board's root is at (0, 0) and at level 0.
+        """
+        colours = None
+        if palette is not None:
+            colours = [colour_index(colour) for colour in palette]
+
+        size, max_depth, bits = _HEADER.unpack_from(data)
+        payload = memoryview(data)[_HEADER.size:]
+        stream = format(int.from_bytes(payload, 'big'),
+                        '0{}b'.format(8 * len(payload)))
+
+        board = Block((0, 0), size, None, 0, max_depth)
+        stack = [board]
+        i = 0
+        while stack:
+            block = stack.pop()
+            if stream[i] == '1':
+                i += 1
+                positions = block._children_positions()
+                for j in range(4):
+                    child = Block(positions[j], block._child_size(), None,
+                                  block.level + 1, max_depth)
+                    child._parent = block
+                    block.children.append(child)
+                stack.extend(reversed(block.children))
+            else:
+                block._colour = int(stream[i + 1:i + bits + 1], 2)
+                if colours is not None:
+                    block._colour = colours[block._colour]
+                i += bits + 1
+
+        return board
+
+    def after_move(self, move: Tuple[str, Optional[int], Block],
+                   colour: Optional[Tuple[int, int, int]] = None) -> \
+            Optional[Block]:
+        """Return a new board that is this board after <move> has been made,
+        or None if <move> cannot be made. This board is not changed.
+
+        <move> is a move in the format returned by Player.generate_move, and
+        <colour> is the colour to use if it is a paint move. A pass returns
+        this board itself.
+
+        Only the Blocks on the path from this Block down to the moved block are
+        copied, so trying a move costs O(max_depth) new Blocks. All other
+        subtrees are shared between the two boards, and the shared Blocks
+        stay linked to this board. A rotate or a swap moves the descendants
+        of the moved block to new places, and a Block works out its position
+        from the parent it is linked to, so the new board copies each of
+        them the first time it reads it instead.
+
+        This board may still be changed in place afterwards, but the boards
+        made from it by after_move must not be used after that, since they
+        may share the Blocks that changed. Those boards must not be changed
+        in place themselves: use after_move on them instead.
+
+        Precondition: this Block is the root of its board.
+        """
+        action, direction, block = move
+        if action == 'pass':
+            return self
+
+        path = self._path_to(block)
+        if path is None:
+            return None
+        target = path[-1]
+
+        if action in ('rotate', 'swap'):
+            if target.children == []:
+                return None
+            new = target._moved_copy()
+            if action == 'rotate':
+                new._rotate_subtree(direction)
+            else:
+                new._swap_children(direction)
+                new._hash = None
+                new._sides = None
+        elif action == 'smash':
+            if not target.smashable():
+                return None
+            new = target._shallow_copy()
+            new._subdivide()
+        elif action == 'paint':
+            if target.level != target.max_depth or target.colour == colour:
+                return None
+            new = target._shallow_copy()
+            new.colour = colour
+        elif action == 'combine':
+            if target.level != target.max_depth - 1 or target.children == []:
+                return None
+            maj_color = target._get_majority_color()
+            if maj_color is None:
+                return None
+            new = Block(target.position, target.size, None, target.level,
+                        target.max_depth)
+            new._colour = maj_color
+        else:
+            return None
+
+        # Copy the path back up to the root, pointing each copy at the new
+        # version of the child below it.
+        for depth in range(len(path) - 2, -1, -1):
+            parent = path[depth]
+            parent_copy = parent._shallow_copy()
+            for i in range(4):
+                if parent.children[i] is path[depth + 1]:
+                    parent_copy.children[i] = new
+            new._parent = parent_copy
+            new = parent_copy
+
+        return new
+
+    # helper
+    def _shallow_copy(self) -> Block:
+        """Return a new Block with the same attributes as this Block, and whose
+        children are the children of this Block themselves.
+        """
+        block = Block(self.position, self.size, None, self.level,
+                      self.max_depth)
+        block._colour = self._colour
+        block.children = self.children[:]
+
+        return block
+
+    # helper
+    def _moved_copy(self) -> Block:
+        """Return a new Block that looks the same as this Block, to be put in
+        place of it in another board, with the same cached summaries.
+
+        The children of the new Block are this Block's own children until
+        they are first read, when they are replaced by moved copies of
+        themselves linked to the new Block. So only the Blocks that are read
+        are ever copied.
+        """
+        block = Block(self._position, self.size, None, self.level,
+                      self.max_depth)
+        block._colour = self._colour
+        block._children = self._children[:]
+        block._rotation = self._rotation
+        block._borrowed = self._children != []
+        block._hash = self._hash
+        if self._sides is not None:
+            block._sides = self._sides[:]
+        block._areas = self._areas
+
+        return block
+
+    # helper
+    def _adopt_children(self) -> None:
+        """Replace the children of this Block, which belong to the board it
+        was copied from, with moved copies of them linked to this Block.
+
+        Precondition: self._borrowed
+        """
+        self._borrowed = False
+        for i in range(len(self._children)):
+            child = self._children[i]._moved_copy()
+            child._parent = self
+            self._children[i] = child
+
+    # helper
+    def _path_to(self, block: Block) -> Optional[List[Block]]:
+        """Return the Blocks on the path from this Block down to <block>, both
+        included, or None if <block> is not a descendant of this Block.
+
+        Blocks shared by boards made with after_move sit at the same place in
+        each of those boards, so the child indices leading to <block> from
+        whichever root its parents lead to also lead to it from this Block.
+        """
+        chain = block._ancestors() + [block]
+        for i in range(len(chain)):
+            if chain[i] is self:
+                return chain[i:]
+
+        indices = []
+        for parent, child in zip(chain, chain[1:]):
+            index = parent._child_index(child)
+            if index == -1:
+                # <child> is no longer a child of its recorded parent.
+                return self._search_path_to(block)
+            indices.append(index)
+
+        path = [self]
+        for i in indices:
+            if path[-1].children == []:
+                return self._search_path_to(block)
+            path.append(path[-1].children[i])
+
+        if path[-1] is block:
+            return path
+        return self._search_path_to(block)
+
+    # helper
+    def _search_path_to(self, block: Block) -> Optional[List[Block]]:
+        """Return the Blocks on the path from this Block down to <block>, both
+        included, or None if <block> is not a descendant of this Block.
+
+        Unlike _path_to, this searches every descendant of this Block.
+        """
+        if self is block:
+            return [self]
+        for child in self.children:
+            path = child._search_path_to(block)
+            if path is not None:
+                return [self] + path
+
+        return None
+
+    def unit_cells(self) -> List[bytearray]:
+        """Return a list of columns representing this Block as rows and
+        columns of unit cells, in the format described in goal._flatten,
+        except that each column is a bytearray and each unit cell is the index
+        of its colour in settings.PALETTE.
+
+        A Block at level 0 keeps the grid it returns and, after an action,
+        only repaints the part of it that the action changed. The grid must
+        not be mutated by the caller, and the tree must only be changed
+        through the methods of Block once the grid has been built.
+        """
+        if self.level != 0:
+            return self._new_cells()
+
+        state = self._board_state()
+        if state.cells is None:
+            state.cells = self._new_cells()
+            state.dirty = []
+        elif state.dirty:
+            self._refresh_cells()
+
+        return state.cells
+
+    def _board_state(self) -> _BoardState:
+        """Return the caches and records of this Block, creating them if this
+        is the first time they are needed.
+
+        The first time, every descendant is also linked to its parent, so that
+        an action on any of them, even on a board whose children were set up
+        by hand, reaches these records.
+
+        Precondition: this Block is the root of its board.
+        """
+        if self._state is None:
+            self._link_descendants()
+            self._state = _BoardState()
+        return self._state
+
+    def _new_cells(self) -> List[bytearray]:
+        """Return a new grid of the unit cells of this Block.
+        """
+        width = 2 ** (self.max_depth - self.level)
+        cells = [bytearray(width) for _ in range(width)]
+        self._paint_cells(cells, 0, 0)
+
+        return cells
+
+    def _paint_cells(self, cells: List[bytearray], column: int,
+                     row: int) -> None:
+        """Copy the colours of this Block into <cells>, with the upper left
+        unit cell of this Block at (<column>, <row>).
+
+        Also link every descendant of this Block that is not linked yet to
+        its parent.
+        """
+        if self.children == []:
+            width = 2 ** (self.max_depth - self.level)
+            colours = bytes((self._colour,)) * width
+            for i in range(column, column + width):
+                cells[i][row:row + width] = colours
+        else:
+            half = 2 ** (self.max_depth - self.level - 1)
+            for i in range(4):
+                child = self.children[i]
+                if child._parent is None:
+                    child._parent = self
+                child._paint_cells(cells, column + _QUADRANTS[i][0] * half,
+                                   row + _QUADRANTS[i][1] * half)
+
+    def _refresh_cells(self) -> None:
+        """Repaint each out of date region of the cached grid of this Block.
+
+        Precondition: self.level == 0 and the grid has been built
+        """
+        cells = self._state.cells
+        # Larger regions first, so that regions inside them can be skipped.
+        self._state.dirty.sort(key=lambda region: -region[2])
+        done = []
+        for column, row, width in self._state.dirty:
+            if any(c <= column < c + w and r <= row < r + w
+                   for c, r, w in done):
+                continue
+            done.append((column, row, width))
+
+            # Find the block whose square is this region, or the leaf that
+            # covers it.
+            block = self
+            block_column = 0
+            block_row = 0
+            block_width = 2 ** self.max_depth
+            while block.children != [] and block_width > width:
+                block_width //= 2
+                right = int(column >= block_column + block_width)
+                lower = int(row >= block_row + block_width)
+                block_column += right * block_width
+                block_row += lower * block_width
+                block = block.children[_CHILD_AT[right][lower]]
+
+            if block.children == []:
+                colours = bytes((block._colour,)) * width
+                for i in range(column, column + width):
+                    cells[i][row:row + width] = colours
+            else:
+                block._paint_cells(cells, column, row)
+
+        self._state.dirty = []
+        for watcher in self._state.watchers.values():
+            watcher.cells_changed(cells, done)
+
+    def cell_watcher(self, name: str,
+                     factory: Optional[Callable[[List[bytearray]], Any]] =
+                     None) -> Any:
+        """Return the watcher called <name> of this board's grid of unit cells,
+        creating it as factory(self.unit_cells()) if there is none yet, or
+        return None if there is none and <factory> is None.
+
+        Whenever unit_cells() brings the grid up to date after actions, it
+        calls watcher.cells_changed(cells, regions) on every watcher, where
+        <regions> are the (column, row, width) squares of <cells> that were
+        repainted. The watcher returned has already seen every action made so
+        far.
+
+        Precondition: self.level == 0
+        """
+        if factory is None and (self._state is None or
+                                name not in self._state.watchers):
+            return None
+
+        cells = self.unit_cells()
+        watchers = self._state.watchers
+        if name not in watchers:
+            watchers[name] = factory(cells)
+
+        return watchers[name]
+
+    def _mark_changed(self, undo: Optional[Tuple[str, Any]] = None,
+                      removed: Optional[List[Block]] = None) -> None:
+        """Record that this Block and its descendants have just been changed
+        by an action. If the action gave this Block new children or took its
+        children away, <removed> is the list of children it had before.
+
+        The cached hashes, side counts and area summaries of this Block and
+        its ancestors are cleared, and if the root of this Block's tree has a
+        cached grid of unit cells, the square of this Block is marked as out
+        of date in it. If the root is recording a journal and <undo> is not
+        None, <undo> is added to it as the (action, data) needed to reverse
+        the change, along with the board's version before the change. If the
+        root has an index of moves, this Block is updated
+        in it.
+        """
+        column = 0
+        row = 0
+        width = 2 ** (self.max_depth - self.level)
+        self._hash = None
+        self._sides = None
+        self._areas = None
+        ancestors = self._ancestors()
+        for parent, child in zip(ancestors, ancestors[1:] + [self]):
+            parent._hash = None
+            parent._sides = None
+            parent._areas = None
+            quadrant = _QUADRANTS[parent._child_index(child)]
+            child_width = 2 ** (child.max_depth - child.level)
+            column += quadrant[0] * child_width
+            row += quadrant[1] * child_width
+
+        state = ancestors[0]._state if ancestors != [] else self._state
+        if state is None:
+            return
+        if state.journal is not None and undo is not None:
+            state.journal.append((self, undo[0], undo[1], state.version))
+        state.version = next(_versions)
+        if state.cells is not None:
+            state.dirty.append((column, row, width))
+        if state.moves is not None:
+            state.moves.update(self, removed)
+
+    def version(self) -> int:
+        """Return a number that identifies what this board looks like now.
+
+        Every successful action on the board gives it a new version, and
+        undo() gives it back the version it had before the action undone. No
+        two boards ever share a version, so anything computed from a board can
+        be cached under its version.
+
+        >>> board = Block((0, 0), 750, COLOUR_LIST[0], 0, 1)
+        >>> before = board.version()
+        >>> board.version() == before
+        True
+        >>> board.smash()
+        True
+        >>> board.version() == before
+        False
+
+        Precondition: this Block is the root of its board.
+        """
+        return self._board_state().version
+
+    def start_journal(self) -> None:
+        """Start recording the actions made on this board, so that they can be
+        reversed with undo().
+
+        Any actions recorded before are forgotten. Like unit_cells, this
+        relies on the tree only being changed through the methods of Block.
+
+        Precondition: this Block is the root of its board.
+        """
+        self._link_descendants()
+        self._board_state().journal = []
+
+    def stop_journal(self) -> None:
+        """Stop recording the actions made on this board, and forget the
+        actions recorded so far.
+        """
+        self._board_state().journal = None
+
+    def recording(self) -> bool:
+        """Return whether the actions made on this board are being recorded
+        for undo().
+
+        Precondition: this Block is the root of its board.
+        """
+        return self._state is not None and self._state.journal is not None
+
+    def undo(self) -> bool:
+        """Reverse the most recent action recorded on this board, restoring
+        every Block it changed to exactly the state it was in before.
+
+        Only the Blocks changed by the action are visited, and no Blocks are
+        created or copied: a smash is reversed by removing the children it
+        made, and a combine by putting back the children it removed.
+
+        Return True iff there was an action to undo.
+
+        Precondition: start_journal() has been called on this Block.
+        """
+        if self._state is None or not self._state.journal:
+            return False
+
+        block, action, data, version = self._state.journal.pop()
+        removed = None
+        if action == 'rotate':
+            block._rotate_subtree(4 - data)
+        elif action == 'swap':
+            # A swap is its own inverse.
+            block._ancestors()
+            block._swap_children(data)
+        elif action == 'smash':
+            removed = block.children
+            for child in removed:
+                child._parent = None
+            block.children = []
+            block._colour = data[0]
+        elif action == 'paint':
+            block._colour = data
+        elif action == 'combine':
+            # The ancestors may have rotations left over from actions undone
+            # since the combine. Their turns were never passed on to this
+            # leaf, so they are applied before the children come back.
+            block._ancestors()
+            block.children = data
+            block._colour = None
+            for child in block.children:
+                child._parent = block
+            removed = []
+        block._mark_changed(removed=removed)
+        # The board looks just as it did before the action again.
+        self._state.version = version
+
+        return True
+
+    # helper
+    def _link_descendants(self) -> None:
+        """Link every descendant of this Block that is not linked yet to its
+        parent.
+
+        Blocks that are linked already are left alone, so that Blocks shared
+        by boards made with after_move stay linked to the board they were
+        made for.
+        """
+        for child in self.children:
+            if child._parent is None:
+                child._parent = self
+            child._link_descendants()
+
+    # helper
+    def _link_children(self) -> None:
+        """Make sure every descendant of this Block is linked to its parent,
+        so that they all work out their positions from this Block's.
+
+        Blocks made by smash and create_copy are always linked, so this only
+        has to walk the subtree the first time it is called on a Block whose
+        children were set up by hand.
+        """
+        if self.children != [] and self.children[0]._parent is None:
+            self._link_descendants()
+
+    # helper
+    def _ancestors(self) -> List[Block]:
+        """Return the Blocks this Block is linked to through its parent, from
+        the furthest one down to its parent.
+
+        Any rotation these Blocks have not passed on yet is applied on the way
+        down, so the children of each of them are in their final order.
+        """
+        ancestors = []
+        block = self._parent
+        while block is not None:
+            ancestors.append(block)
+            block = block._parent
+        ancestors.reverse()
+
+        for ancestor in ancestors:
+            if ancestor._rotation != 0:
+                ancestor._apply_rotation()
+
+        return ancestors
+
+    # helper
+    def _child_index(self, child: Block) -> int:
+        """Return the index of <child> in the children of this Block, or -1
+        if it is not one of them.
+        """
+        children = self.children
+        for i in range(len(children)):
+            if children[i] is child:
+                return i
+
+        return -1
+
 
 if __name__ == '__main__':
     import python_ta
@@ -419,7 +1990,7 @@ if __name__ == '__main__':
     python_ta.check_all(config={
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing', '__future__', 'math',
-            'settings'
+            'itertools', 'struct', 'settings'
         ],
         'max-attributes': 15,
         'max-args': 6
@@ -23,16 +23,21 @@ This file contains the different game states for the Blocky game.
 """
 
 from __future__ import annotations
+from collections import OrderedDict
 from typing import Dict, List, Optional, Tuple
 import pygame
 
 from actions import ACTION_MESSAGE, ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE,\
     SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PASS, PAINT, COMBINE, ACTION_PENALTY
 from block import Block
+from goal import BlobGoal, Goal, goal_scores, track_blobs
 from player import Player
 from renderer import Renderer
 from settings import ANIMATION_DURATION
 
+# The most goal scores a GameData keeps in its score cache.
+SCORE_CACHE_SIZE = 64
+
 
 def _block_to_squares(board: Block) -> List[Tuple[Tuple[int, int, int],
                                                   Tuple[int, int], int]]:
@@ -80,12 +85,18 @@ class GameData:
     === Representation Invariants ===
     - len(players) >= 1
     """
+    # === Private Attributes ===
+    # _score_cache:
+    #   Goal scores computed recently, keyed by (board version, goal type,
+    #   goal colour) and ordered from least to most recently used. It holds
+    #   at most SCORE_CACHE_SIZE scores.
     max_turns: int
     board: Block
     players: List[Player]
     smashes: Dict[int, int]
     combines: Dict[int, int]
     paints: Dict[int, int]
+    _score_cache: OrderedDict[Tuple[int, type, Tuple[int, int, int]], int]
 
     def __init__(self, board: Block, players: List[Player]) -> None:
         """Initialize the game data, saving a reference to <board> and
@@ -97,10 +108,15 @@ class GameData:
         self.max_turns = 0
         self.board = board
         self.players = players
+        if isinstance(board, Block):
+            board.cache_summaries()
+        if any(isinstance(player.goal, BlobGoal) for player in players):
+            track_blobs(board)
 
         self.smashes = {}
         self.combines = {}
         self.paints = {}
+        self._score_cache = OrderedDict()
 
         # Start off all counts at 0
         for player in players:
@@ -113,13 +129,54 @@ class GameData:
         their goal in the game and second the deductions from their score based
         on the actions they've taken.
         """
-        goal_score = self.players[player_id].goal.score(self.board)
+        goal_score = self._goal_scores([self.players[player_id].goal])[0]
+
+        return goal_score, self._penalty(player_id)
 
-        penalty = self.smashes[player_id] * ACTION_PENALTY[SMASH] + \
-                  self.combines[player_id] * ACTION_PENALTY[COMBINE] + \
-                  self.paints[player_id] * ACTION_PENALTY[PAINT]
+    def calculate_scores(self) -> Dict[int, Tuple[int, int]]:
+        """Return a dictionary mapping each player's id to the same tuple that
+        calculate_score returns for that player.
+
+        The goals of all players are scored together, so the board is read
+        once for all perimeter goals and once for all blob goals.
+        """
+        lst_scores = self._goal_scores([player.goal for player in self.players])
 
-        return goal_score, penalty
+        scores = {}
+        for player, goal_score in zip(self.players, lst_scores):
+            scores[player.id] = (goal_score, self._penalty(player.id))
+        return scores
+
+    def _goal_scores(self, goals: List[Goal]) -> List[int]:
+        """Return the score of each goal in <goals> on the board, in the same
+        order.
+
+        Scores already computed for the board as it is now are taken from the
+        score cache, and the rest are computed together and added to it.
+        """
+        version = self.board.version()
+        keys = [(version, type(goal), goal.colour) for goal in goals]
+        missing = [goal for goal, key in zip(goals, keys)
+                   if key not in self._score_cache]
+        for goal, score in zip(missing, goal_scores(self.board, missing)):
+            self._score_cache[(version, type(goal), goal.colour)] = score
+
+        scores = []
+        for key in keys:
+            self._score_cache.move_to_end(key)
+            scores.append(self._score_cache[key])
+        while len(self._score_cache) > SCORE_CACHE_SIZE:
+            self._score_cache.popitem(last=False)
+
+        return scores
+
+    def _penalty(self, player_id: int) -> int:
+        """Return the deductions from <player_id>'s score based on the actions
+        they've taken.
+        """
+        return self.smashes[player_id] * ACTION_PENALTY[SMASH] + \
+            self.combines[player_id] * ACTION_PENALTY[COMBINE] + \
+            self.paints[player_id] * ACTION_PENALTY[PAINT]
 
 
 class GameState:
@@ -337,8 +394,9 @@ class GameOverState(GameState):
         """Initialize this GameState.
         """
         self._scores = []
+        scores = data.calculate_scores()
         for p in data.players:
-            goal_score, penalty = data.calculate_score(p.id)
+            goal_score, penalty = scores[p.id]
             self._scores.append((p.id, goal_score, penalty))
 
         self._winner = max(self._scores, key=lambda item: item[1] - item[2])[0]
@@ -373,7 +431,8 @@ if __name__ == '__main__':
         'allowed-io': ['run_game'],
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing', 'pygame', '__future__',
-            'block', 'player', 'renderer', 'settings', 'actions'
+            'collections', 'block', 'goal', 'player', 'renderer', 'settings',
+            'actions'
         ],
         'generated-members': 'pygame.*'
     })
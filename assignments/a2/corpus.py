@@ -0,0 +1,189 @@
+"""CSC148 Assignment 2
+
+=== CSC148 Winter 2020 ===
+Department of Computer Science,
+University of Toronto
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, David Liu, Mario Badr, Sophia Huynh, Misha Schwartz,
+and Jaisie Sin
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) Diane Horton, David Liu, Mario Badr, Sophia Huynh,
+Misha Schwartz, and Jaisie Sin
+
+=== Module Description ===
+
+This file contains functions for storing many boards in one corpus file, and
+BoardCorpus, which memory-maps such a file so that boards can be read one at
+a time without loading or parsing the whole file.
+
+A corpus file is laid out as follows, with all integers big-endian:
+    - a header: the magic bytes b'BLKY' and a 2-byte format version
+    - the boards, one after another, each encoded by Block.to_bytes
+    - an index: for each board, the 8-byte offset at which it starts,
+      followed by the offset at which the index itself starts
+    - the palette: a 1-byte count of colours, then the red, green and blue
+      bytes of each colour in settings.PALETTE, in order
+    - a trailer: the 8-byte offset of the index, the 8-byte board count and
+      the 8-byte offset of the palette
+The index is written after the boards so that a corpus can be written from a
+stream of boards without knowing how many there will be. The palette is
+written last of all, so that it has every colour the boards use, and boards
+read back in another program get the same colours even if its PALETTE is in
+a different order.
+"""
+from __future__ import annotations
+from typing import Any, Iterable, Iterator, List, Tuple
+import mmap
+import struct
+
+from block import Block
+from settings import PALETTE
+
+_MAGIC = b'BLKY'
+_VERSION = 2
+_HEADER = struct.Struct('>4sH')
+_OFFSET = struct.Struct('>Q')
+_TRAILER = struct.Struct('>QQQ')
+
+
+def write_corpus(path: str, boards: Iterable[Block]) -> int:
+    """Write <boards> to a new corpus file at <path>, replacing any file that
+    is there, and return the number of boards written.
+
+    <boards> is only iterated over once, so it may be a generator.
+    """
+    offsets = []
+    with open(path, 'wb') as file:
+        file.write(_HEADER.pack(_MAGIC, _VERSION))
+        position = _HEADER.size
+        for board in boards:
+            data = board.to_bytes()
+            offsets.append(position)
+            file.write(data)
+            position += len(data)
+
+        offsets.append(position)
+        file.write(b''.join(_OFFSET.pack(offset) for offset in offsets))
+        palette = position + len(offsets) * _OFFSET.size
+        file.write(bytes([len(PALETTE)]))
+        file.write(b''.join(bytes(colour) for colour in PALETTE))
+        file.write(_TRAILER.pack(position, len(offsets) - 1, palette))
+
+    return len(offsets) - 1
+
+
+class BoardCorpus:
+    """A read-only, memory-mapped corpus file.
+
+    Boards are decoded only when they are asked for, so iterating over a
+    corpus holds one board at a time no matter how large the file is.
+
+    === Private Attributes ===
+    _file:
+        The open corpus file.
+    _map:
+        The memory map of <_file>.
+    _index:
+        The offset at which the index of the corpus starts.
+    _count:
+        The number of boards in the corpus.
+    _palette:
+        PALETTE as it was when the corpus was written.
+    """
+    _file: Any
+    _map: mmap.mmap
+    _index: int
+    _count: int
+    _palette: List[Tuple[int, int, int]]
+
+    def __init__(self, path: str) -> None:
+        """Open the corpus file at <path>.
+
+        Raise a ValueError if the file is not a corpus file.
+        """
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise
+
+        if len(self._map) < _HEADER.size + _OFFSET.size + _TRAILER.size or \
+                _HEADER.unpack_from(self._map) != (_MAGIC, _VERSION):
+            self.close()
+            raise ValueError(f'{path} is not a board corpus')
+
+        self._index, self._count, palette = _TRAILER.unpack_from(
+            self._map, len(self._map) - _TRAILER.size)
+        colours = self._map[palette + 1:palette + 1 + 3 * self._map[palette]]
+        self._palette = [tuple(colours[i:i + 3])
+                         for i in range(0, len(colours), 3)]
+
+    def __len__(self) -> int:
+        """Return the number of boards in this corpus.
+        """
+        return self._count
+
+    def __getitem__(self, i: int) -> Block:
+        """Return a new Block for board <i> of this corpus.
+        """
+        return Block.from_bytes(self.record(i), self._palette)
+
+    def __iter__(self) -> Iterator[Block]:
+        """Yield a new Block for each board in this corpus, in order.
+        """
+        for i in range(self._count):
+            yield self[i]
+
+    def record(self, i: int) -> bytes:
+        """Return board <i> of this corpus as encoded by Block.to_bytes,
+        without decoding it.
+
+        Raise an IndexError if there is no board <i>.
+        """
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError('corpus index out of range')
+
+        start, = _OFFSET.unpack_from(self._map, self._index + i * _OFFSET.size)
+        end, = _OFFSET.unpack_from(self._map,
+                                   self._index + (i + 1) * _OFFSET.size)
+        return self._map[start:end]
+
+    def close(self) -> None:
+        """Close the corpus file.
+        """
+        if not self._map.closed:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> BoardCorpus:
+        """Return this corpus, for use in a with statement.
+        """
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Close this corpus at the end of a with statement.
+        """
+        self.close()
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'typing', '__future__', 'mmap', 'struct',
+            'block', 'settings'
+        ],
+        'allowed-io': ['write_corpus', 'BoardCorpus.__init__'],
+    })
@@ -23,17 +23,24 @@ This file contains some sample tests for Assignment 2.
 Please use this as a starting point to check your work and write your own
 tests!
 """
-from typing import List, Optional, Tuple
+from typing import List, Optional, Set, Tuple
 import os
+import random
 import pygame
 import pytest
 
-from block import Block
-from blocky import _block_to_squares
-from goal import BlobGoal, PerimeterGoal, _flatten
-from player import _get_block
+from block import Block, _MoveIndex, generate_board
+from blocky import GameData, SCORE_CACHE_SIZE, _block_to_squares
+from corpus import BoardCorpus, write_corpus
+from goal import BlobGoal, PerimeterGoal, _flatten, _largest_blobs, \
+    blob_scores, perimeter_scores, track_blobs
+from player import MCTSPlayer, RandomPlayer, SmartPlayer, _get_block, \
+    _make_move
+from quadtree import LinearQuadtree, QuadtreeBlock, \
+    generate_linear_board, generate_seeded_boards
 from renderer import Renderer
-from settings import COLOUR_LIST
+from settings import COLOUR_LIST, PALETTE
+import settings
 
 
 def set_children(block: Block, colours: List[Optional[Tuple[int, int, int]]]) \
@@ -55,6 +62,51 @@ def set_children(block: Block, colours: List[Optional[Tuple[int, int, int]]]) \
         block.children.append(b)
 
 
+def _random_block(board: Block) -> Block:
+    """Return a randomly chosen block of <board>.
+    """
+    block = board
+    while block.children != [] and random.random() < 0.8:
+        block = random.choice(block.children)
+
+    return block
+
+
+def _random_action(block: Block) -> bool:
+    """Try a randomly chosen action on <block>, and return whether it was
+    performed.
+    """
+    action = random.randint(0, 4)
+    if action == 0:
+        return block.rotate(random.choice([1, 3]))
+    elif action == 1:
+        return block.swap(random.randint(0, 1))
+    elif action == 2:
+        return block.smash()
+    elif action == 3:
+        return block.paint(random.choice(COLOUR_LIST))
+    else:
+        return block.combine()
+
+
+def _index_contents(index: _MoveIndex) -> List[Set[int]]:
+    """Return the ids of the blocks in each set of <index>.
+    """
+    sets = [index.parents, index.smashable, index.combinable] + \
+        [index.leaves[key] for key in sorted(index.leaves)]
+    return [{id(block) for block in blocks} for blocks in sets]
+
+
+def _all_blocks(board: Block) -> List[int]:
+    """Return the ids of all the blocks in <board>, in preorder.
+    """
+    ids = [id(board)]
+    for child in board.children:
+        ids.extend(_all_blocks(child))
+
+    return ids
+
+
 @pytest.fixture
 def renderer() -> Renderer:
     os.environ['SDL_VIDEODRIVER'] = 'dummy'
@@ -164,6 +216,18 @@ def test_block_to_squares_reference(board_16x16) -> None:
     assert squares == expected
 
 
+def test_palette_is_limited(monkeypatch) -> None:
+    """Test that a colour past the limit on the size of the palette is
+    refused, and leaves the palette as it was.
+    """
+    monkeypatch.setattr(settings, 'MAX_COLOURS', len(PALETTE))
+    size = len(PALETTE)
+    with pytest.raises(ValueError):
+        settings.colour_index((1, 2, 3))
+    assert len(PALETTE) == size
+    assert settings.colour_index(COLOUR_LIST[0]) == 0
+
+
 class TestRender:
     """A collection of methods that show you a way to save the boards in your
     test cases to image (i.e., PNG) files.
@@ -277,6 +341,393 @@ class TestBlock:
         board_16x16.children[0].rotate(1)
         assert board_16x16 == board_16x16_rotate1
 
+    def test_rotate_is_lazy(self, board_16x16, board_16x16_rotate1) -> None:
+        """Test that rotating a block only records the rotation, and that it
+        is passed on correctly when the children are read.
+        """
+        grandchild = board_16x16.children[0].children[1]
+
+        assert board_16x16.rotate(3)
+        assert board_16x16._rotation == 3
+        assert board_16x16._children[0]._rotation == 0
+        assert grandchild.position == (0, 188)
+        assert board_16x16._rotation == 0
+
+        assert board_16x16.rotate(1)
+        assert board_16x16.children[0].rotate(1)
+        assert board_16x16 == board_16x16_rotate1
+
+    def test_hash_of_copy(self, board_16x16) -> None:
+        """Test that a board and its copy hash the same, and that the copy can
+        be used to look the board up in a dictionary.
+        """
+        copy = board_16x16.create_copy()
+        scores = {board_16x16: 1}
+
+        assert hash(copy) == hash(board_16x16)
+        assert scores[copy] == 1
+
+    def test_version_of_board_set_up_by_hand(self, board_16x16) -> None:
+        """Test that an action on a descendant of a board whose children were
+        set up by hand gives the board a new version.
+        """
+        before = board_16x16.version()
+        assert board_16x16.children[0].children[0].paint(COLOUR_LIST[3])
+        assert board_16x16.version() != before
+
+    def test_hash_cleared_by_actions(self, board_16x16) -> None:
+        """Test that the hash changes after an action that changes the board,
+        and that it matches the hash of a freshly built equal board.
+        """
+        before = board_16x16.subtree_hash()
+        copy = board_16x16.create_copy()
+
+        assert board_16x16.children[0].children[3].paint(COLOUR_LIST[0])
+        assert board_16x16.subtree_hash() != before
+        assert board_16x16 != copy
+
+        assert copy.children[0].children[3].paint(COLOUR_LIST[0])
+        assert board_16x16.subtree_hash() == copy.subtree_hash()
+        assert board_16x16 == copy
+
+    def test_hash_ignores_position(self, board_16x16) -> None:
+        """Test that subtrees which look the same hash the same even when they
+        are in different places.
+        """
+        children = board_16x16.children
+
+        assert children[1].subtree_hash() != children[2].subtree_hash()
+        assert children[2].subtree_hash() == \
+               Block((0, 0), 375, COLOUR_LIST[1], 1, 2).subtree_hash()
+
+    def test_hash_of_uncoloured_leaf(self) -> None:
+        """Test that a leaf with no colour does not hash like a leaf of any
+        colour in the palette.
+        """
+        uncoloured = Block((0, 0), 750, None, 0, 0).subtree_hash()
+        for i in range(len(PALETTE)):
+            leaf = Block((0, 0), 750, PALETTE[i], 0, 0)
+            assert leaf.subtree_hash() != uncoloured
+
+    def test_after_move_shares_untouched_subtrees(self, board_16x16) -> None:
+        """Test that after_move leaves the board alone, copies only the path
+        to the moved block, and gives the same board as the move would.
+        """
+        original = board_16x16.create_copy()
+        block = board_16x16.children[0].children[3]
+
+        new = board_16x16.after_move(('paint', None, block), COLOUR_LIST[2])
+
+        assert board_16x16 == original
+        assert new is not board_16x16
+        assert new.children[0] is not board_16x16.children[0]
+        for i in range(1, 4):
+            assert new.children[i] is board_16x16.children[i]
+        for i in range(3):
+            assert new.children[0].children[i] is \
+                   board_16x16.children[0].children[i]
+
+        assert original.children[0].children[3].paint(COLOUR_LIST[2])
+        assert new == original
+
+    def test_after_move_matches_moves_in_place(self) -> None:
+        """Test that a chain of boards made with after_move matches making the
+        same moves in place on a copy.
+        """
+        random.seed(148)
+        board = generate_board(4, 750)
+        copy = board.create_copy()
+        for _ in range(100):
+            block = _random_block(board)
+            path = board._path_to(block)
+            in_place = copy
+            for parent, child in zip(path, path[1:]):
+                index = [c is child for c in parent.children].index(True)
+                in_place = in_place.children[index]
+
+            action = random.choice(['rotate', 'swap', 'smash', 'paint',
+                                    'combine'])
+            direction = random.choice([1, 3]) if action == 'rotate' else \
+                random.randint(0, 1)
+            colour = random.choice(COLOUR_LIST)
+            seed = random.random()
+
+            random.seed(seed)
+            new = board.after_move((action, direction, block), colour)
+            random.seed(seed)
+            if action == 'rotate':
+                done = in_place.rotate(direction)
+            elif action == 'swap':
+                done = in_place.swap(direction)
+            elif action == 'smash':
+                done = in_place.smash()
+            elif action == 'paint':
+                done = in_place.paint(colour)
+            else:
+                done = in_place.combine()
+
+            assert done == (new is not None)
+            if new is not None:
+                board = new
+            assert board == copy
+
+    def test_after_move_rotate_and_swap_copy_only_the_path(self) -> None:
+        """Test that a rotate or swap made with after_move leaves the Blocks
+        below the moved block to be copied when they are first read.
+        """
+        random.seed(148)
+        board = generate_board(4, 750)
+        while board.children == []:
+            board = generate_board(4, 750)
+        original = board.create_copy()
+
+        new = board.after_move(('rotate', 1, board))
+        assert [id(child) for child in new._children] == \
+               [id(child) for child in board.children]
+        original.rotate(1)
+        assert new == original
+        original.rotate(3)
+        assert board == original
+
+        new = board.after_move(('swap', 0, board))
+        grandchildren = [child._children for child in board.children]
+        assert [[id(block) for block in child._children]
+                for child in new._children] == \
+               [[id(block) for block in blocks]
+                for blocks in [grandchildren[1], grandchildren[0],
+                               grandchildren[3], grandchildren[2]]]
+        original.swap(0)
+        assert new == original
+        assert new.unit_cells() == original.unit_cells()
+
+    def test_board_changed_in_place_after_lookahead(self) -> None:
+        """Test that a board can still be changed in place after boards made
+        from it by after_move have been read.
+        """
+        random.seed(148)
+        board = generate_board(4, 750)
+        board.unit_cells()
+        for _ in range(100):
+            colour = random.choice(COLOUR_LIST)
+            move = random.choice(board.valid_moves(colour))
+            new = board.after_move(move, colour)
+            new.unit_cells()
+            new.valid_moves(colour)
+            new.side_counts(0)
+            new.area_summary()
+            new.subtree_hash()
+
+            version = board.version()
+            move = board.random_move(colour)
+            assert _make_move(move, colour)
+            assert board.version() != version
+            assert board.unit_cells() == board._new_cells()
+            assert board.subtree_hash() == \
+                board.create_copy().subtree_hash()
+
+        assert _index_contents(board._state.moves) == \
+            _index_contents(_MoveIndex(board))
+
+    def test_undo_restores_every_action(self) -> None:
+        """Test that undoing a journal of random actions goes back through
+        exactly the boards that were there before each action, with the
+        versions they had.
+        """
+        random.seed(148)
+        board = generate_board(4, 750)
+        board.start_journal()
+        history = []
+        for _ in range(100):
+            before = (board.create_copy(), _all_blocks(board), board.version())
+            if _random_action(_random_block(board)):
+                history.append(before)
+                assert board.version() != before[2]
+
+        while history:
+            copy, blocks, version = history.pop()
+            assert board.undo()
+            assert board.version() == version
+            assert board == copy
+            assert board.unit_cells() == copy.unit_cells()
+            assert _all_blocks(board) == blocks
+
+        assert not board.undo()
+
+    def test_move_index_follows_actions_and_undos(self) -> None:
+        """Test that the index of moves kept by a board matches a new index
+        of the board after every action and undo.
+        """
+        random.seed(148)
+        board = generate_board(4, 750)
+        board.start_journal()
+        board.random_move(COLOUR_LIST[0])
+        for _ in range(200):
+            if random.random() < 0.3:
+                board.undo()
+            else:
+                _random_action(_random_block(board))
+            assert _index_contents(board._state.moves) == \
+                _index_contents(_MoveIndex(board))
+
+    def test_undo_without_recording(self, board_16x16) -> None:
+        """Test that actions made after stop_journal cannot be undone.
+        """
+        board_16x16.start_journal()
+        assert board_16x16.children[0].combine()
+        board_16x16.stop_journal()
+        board_16x16.start_journal()
+        assert board_16x16.swap(0)
+
+        assert board_16x16.undo()
+        assert not board_16x16.undo()
+        assert board_16x16.children[0].children == []
+
+    def test_unit_cells_only_repaints_changed_region(self, board_16x16) -> None:
+        """Test that the cached grid of the board is updated after an action,
+        and that only the square of the changed block is marked out of date.
+        """
+        cells = board_16x16.unit_cells()
+        block = board_16x16.children[0].children[3]
+
+        assert block.paint(COLOUR_LIST[2])
+        assert board_16x16._state.dirty == [(3, 1, 1)]
+        assert board_16x16.unit_cells() is cells
+        assert cells[3][1] == 2
+        assert board_16x16._state.dirty == []
+
+    def test_unit_cells_match_after_random_actions(self) -> None:
+        """Test that the cached grid stays equal to a freshly built one while
+        random actions are performed on a board.
+        """
+        random.seed(148)
+        board = generate_board(4, 750)
+        board.unit_cells()
+        for _ in range(200):
+            _random_action(_random_block(board))
+            assert board.unit_cells() == board._new_cells()
+
+    def test_blocks_have_no_instance_dict(self, board_16x16) -> None:
+        """Test that blocks use slots and keep their colour as a palette
+        index while still exposing it as RGB.
+        """
+        leaf = board_16x16.children[2]
+        assert not hasattr(leaf, '__dict__')
+        assert leaf.colour == COLOUR_LIST[1]
+        assert leaf._colour == 1
+        assert board_16x16.colour is None
+        assert board_16x16.unit_cells()[0][0] == 2
+
+    def test_bytes_round_trip(self, board_16x16) -> None:
+        """Test that a board decoded from its bytes equals the original, and
+        that the encoding uses 3 bits per leaf and 1 per parent.
+        """
+        data = board_16x16.to_bytes()
+        assert len(data) == 4 + 3
+        assert Block.from_bytes(data) == board_16x16
+
+        random.seed(148)
+        board = generate_board(5, 750)
+        for _ in range(50):
+            _random_action(_random_block(board))
+            assert Block.from_bytes(board.to_bytes()) == board
+
+    def test_bytes_do_not_depend_on_palette(self, board_16x16) -> None:
+        """Test that a board's bytes stay the same when colours are added to
+        PALETTE, and that they can be decoded with the palette of another
+        program.
+        """
+        data = board_16x16.to_bytes()
+        leaf = Block((0, 0), 750, (10, 20, 30), 0, 0)
+        settings.colour_index((40, 50, 60))
+        assert board_16x16.to_bytes() == data
+        assert Block.from_bytes(leaf.to_bytes(), PALETTE[:]) == leaf
+
+        leaf = Block((0, 0), 750, COLOUR_LIST[0], 0, 0)
+        other = [COLOUR_LIST[1], COLOUR_LIST[0]]
+        assert Block.from_bytes(leaf.to_bytes(), other).colour == \
+            COLOUR_LIST[1]
+
+    def test_valid_moves(self) -> None:
+        """Test that every move listed by valid_moves can be made, and that
+        every other move either cannot be made or leaves the unit cells as
+        they were.
+        """
+        random.seed(148)
+        board = generate_board(4, 750)
+        for _ in range(20):
+            colour = random.choice(COLOUR_LIST)
+            moves = board.valid_moves(colour)
+            listed = {(move[0], move[1], id(move[2])) for move in moves}
+            assert len(listed) == len(moves)
+
+            blocks = [board]
+            for block in blocks:
+                blocks.extend(block.children)
+            for block in blocks:
+                for action, direction in [('rotate', 1), ('rotate', 3),
+                                          ('swap', 0), ('swap', 1),
+                                          ('smash', None), ('paint', None),
+                                          ('combine', None)]:
+                    new = board.after_move((action, direction, block), colour)
+                    if (action, direction, id(block)) in listed:
+                        assert new is not None
+                    elif new is not None:
+                        assert action in ('rotate', 'swap')
+                        assert new.unit_cells() == board.unit_cells()
+
+            board = board.after_move(random.choice(moves), colour)
+
+
+class TestCorpus:
+    """A collection of methods for testing the corpus module.
+    """
+
+    def test_write_and_read(self, tmp_path) -> None:
+        """Test that every board written to a corpus is read back unchanged.
+        """
+        boards = generate_seeded_boards(20, 4, 750, seed=1,
+                                        as_blocks=True)
+        path = str(tmp_path / 'boards.corpus')
+        assert write_corpus(path, iter(boards)) == 20
+
+        with BoardCorpus(path) as corpus:
+            assert len(corpus) == 20
+            assert list(corpus) == boards
+            assert corpus[-1] == boards[-1]
+            assert corpus.record(3) == boards[3].to_bytes()
+            with pytest.raises(IndexError):
+                corpus.record(20)
+
+    def test_palette_is_written(self, tmp_path) -> None:
+        """Test that a corpus keeps the palette its boards were written with.
+        """
+        board = Block((0, 0), 750, None, 0, 1)
+        set_children(board, [COLOUR_LIST[0], (70, 80, 90), COLOUR_LIST[2],
+                             COLOUR_LIST[3]])
+        path = str(tmp_path / 'palette.corpus')
+        write_corpus(path, [board])
+
+        with BoardCorpus(path) as corpus:
+            assert corpus._palette == PALETTE
+            assert corpus[0] == board
+
+    def test_empty_corpus(self, tmp_path) -> None:
+        """Test that a corpus with no boards can be written and read.
+        """
+        path = str(tmp_path / 'empty.corpus')
+        assert write_corpus(path, []) == 0
+        with BoardCorpus(path) as corpus:
+            assert len(corpus) == 0
+            assert list(corpus) == []
+
+    def test_not_a_corpus(self, tmp_path) -> None:
+        """Test that opening a file that is not a corpus raises ValueError.
+        """
+        path = tmp_path / 'other.corpus'
+        path.write_bytes(b'not a corpus file at all, just some bytes')
+        with pytest.raises(ValueError):
+            BoardCorpus(str(path))
+
 
 class TestPlayer:
     """A collection of methods for testing the methods and functions in the
@@ -304,6 +755,211 @@ class TestPlayer:
         assert _get_block(board_16x16, top_right, 2) == \
                board_16x16.children[0].children[0]
 
+    def test_get_block_outside_board(self, board_16x16) -> None:
+        """Test that no block is found on the bottom or right edge of the
+        board, or past it.
+        """
+        size = board_16x16.size
+        assert _get_block(board_16x16, (size, 0), 0) is None
+        assert _get_block(board_16x16, (0, size), 2) is None
+        assert _get_block(board_16x16, (-1, 10), 1) is None
+
+    def test_locate_all_matches_get_block(self) -> None:
+        """Test that a batch of queries finds the same blocks as one query at a
+        time, on a board whose size does not halve evenly.
+        """
+        random.seed(148)
+        board = generate_board(4, 93)
+        queries = [((random.randint(-2, 95), random.randint(-2, 95)),
+                    random.randint(0, 4)) for _ in range(500)]
+        results = board.locate_all(queries)
+        for (location, level), result in zip(queries, results):
+            assert result is _get_block(board, location, level)
+
+    def test_random_player_makes_valid_moves(self) -> None:
+        """Test that a RandomPlayer only chooses moves that can be made,
+        without changing the board, and that its move index follows the
+        board through the moves made.
+        """
+        random.seed(148)
+        board = generate_board(4, 750)
+        player = RandomPlayer(0, PerimeterGoal(COLOUR_LIST[0]))
+        for _ in range(100):
+            copy = board.create_copy()
+            player._proceed = True
+            action, direction, block = player.generate_move(board)
+            assert board == copy
+            if action == 'rotate':
+                assert block.rotate(direction)
+            elif action == 'swap':
+                assert block.swap(direction)
+            elif action == 'smash':
+                assert block.smash()
+            elif action == 'paint':
+                assert block.paint(player.goal.colour)
+            else:
+                assert block.combine()
+
+        assert _index_contents(board._state.moves) == \
+            _index_contents(_MoveIndex(board))
+
+    def test_random_player_passes_without_moves(self) -> None:
+        """Test that a RandomPlayer passes when no move can be made.
+        """
+        board = Block((0, 0), 750, COLOUR_LIST[0], 0, 0)
+        player = RandomPlayer(0, PerimeterGoal(COLOUR_LIST[0]))
+        player._proceed = True
+        assert player.generate_move(board) == ('pass', None, board)
+
+    def test_smart_player_leaves_board_unchanged(self) -> None:
+        """Test that a SmartPlayer chooses a move that raises its score, or
+        passes, and leaves the board and any journal being recorded on it as
+        they were.
+        """
+        random.seed(148)
+        for goal in [PerimeterGoal(COLOUR_LIST[0]), BlobGoal(COLOUR_LIST[1])]:
+            board = generate_board(4, 750)
+            board.start_journal()
+            assert board.rotate(1)
+            player = SmartPlayer(0, goal, 10)
+            made = 0
+            for _ in range(20):
+                copy = board.create_copy()
+                score = goal.score(board)
+                player._proceed = True
+                move = player.generate_move(board)
+                assert board == copy
+                assert board.unit_cells() == copy.unit_cells()
+                assert board.recording()
+                if move[0] == 'pass':
+                    continue
+                assert _make_move(move, goal.colour)
+                assert move[0] == 'smash' or goal.score(board) > score
+                made += 1
+
+            for _ in range(made + 1):
+                assert board.undo()
+            assert not board.undo()
+
+    def test_players_on_linear_board(self) -> None:
+        """Test that every kind of computer player chooses moves that can be
+        made on a board built by generate_linear_board, without changing it.
+        """
+        random.seed(148)
+        for goal in [PerimeterGoal(COLOUR_LIST[0]), BlobGoal(COLOUR_LIST[1])]:
+            players = [RandomPlayer(0, goal), SmartPlayer(1, goal, 10),
+                       MCTSPlayer(2, goal, node_limit=50)]
+            board = generate_linear_board(3, 750)
+            for _ in range(5):
+                for player in players:
+                    copy = board.create_copy()
+                    player._proceed = True
+                    move = player.generate_move(board)
+                    assert board == copy
+                    if move[0] != 'pass':
+                        assert isinstance(move[2], QuadtreeBlock)
+                        assert _make_move(move, goal.colour)
+
+    def test_smart_player_in_pool_matches_serial(self) -> None:
+        """Test that a SmartPlayer assessing its moves in worker processes
+        chooses the same moves as one assessing them itself.
+        """
+        for goal in [PerimeterGoal(COLOUR_LIST[0]), BlobGoal(COLOUR_LIST[1])]:
+            chosen = []
+            for workers in [0, 3]:
+                random.seed(148)
+                board = generate_board(4, 750)
+                player = SmartPlayer(0, goal, 12, workers)
+                moves = []
+                pools = set()
+                for _ in range(4):
+                    player._proceed = True
+                    move = player.generate_move(board)
+                    moves.append((move[0], move[1], move[2].position,
+                                  move[2].level))
+                    _make_move(move, goal.colour)
+                    pools.add(id(player._pool))
+                moves.append(random.random())
+                chosen.append(moves)
+
+                # The same processes assess every move until the player is
+                # closed.
+                assert len(pools) == 1
+                player.close()
+                assert player._pool is None
+
+            assert chosen[0] == chosen[1]
+
+    def test_smart_player_in_pool_sees_new_colours(self) -> None:
+        """Test that worker processes started before colours were added to
+        PALETTE assess moves with those colours as the player would itself.
+        """
+        player = SmartPlayer(0, PerimeterGoal(COLOUR_LIST[0]), 6, 2)
+        player._proceed = True
+        player.generate_move(generate_board(2, 750))
+
+        colours = [(70, 80, 90), (100, 110, 120)]
+        player.goal = PerimeterGoal(colours[1])
+        chosen = []
+        for current in [player, SmartPlayer(0, player.goal, 6)]:
+            board = Block((0, 0), 750, None, 0, 2)
+            set_children(board, [colours[0], None, colours[1], None])
+            set_children(board.children[1], colours + colours)
+            set_children(board.children[3], [colours[0]] * 4)
+            random.seed(148)
+            current._proceed = True
+            move = current.generate_move(board)
+            chosen.append((move[0], move[1], move[2].position,
+                           move[2].level))
+        player.close()
+
+        assert chosen[0] == chosen[1]
+
+    def test_mcts_player_reuses_its_tree(self) -> None:
+        """Test that an MCTSPlayer leaves the board unchanged, searches for
+        the number of rounds it is given, and goes on from the part of its
+        tree below the move it made when the board is as that move left it.
+        """
+        random.seed(148)
+        board = generate_board(3, 750)
+        goal = BlobGoal(COLOUR_LIST[2])
+        player = MCTSPlayer(0, goal, node_limit=40)
+        for _ in range(6):
+            copy = board.create_copy()
+            kept = player._tree
+            visits = 0 if kept is None else kept.visits
+            player._proceed = True
+            move = player.generate_move(board)
+            assert board == copy
+
+            if kept is not None and kept.key == board.subtree_hash():
+                assert player._tree in kept.children
+                assert kept.visits == visits + 40
+            if move[0] != 'pass':
+                assert _make_move(move, goal.colour)
+
+    def test_mcts_player_can_pass_from_kept_tree(self) -> None:
+        """Test that PASS is among the moves tried from the root when the
+        root is a node kept from the last turn.
+        """
+        random.seed(148)
+        board = generate_board(3, 750)
+        goal = PerimeterGoal(COLOUR_LIST[0])
+        player = MCTSPlayer(0, goal, node_limit=200)
+        player._proceed = True
+        move = player.generate_move(board)
+        while move[0] == 'pass':
+            player._proceed = True
+            move = player.generate_move(board)
+        assert _make_move(move, goal.colour)
+
+        kept = player._tree
+        assert kept.key == board.subtree_hash()
+        player._proceed = True
+        player.generate_move(board)
+        assert 'pass' in [child.move[0] for child in kept.children] + \
+            [move[0] for move in kept.untried]
+
 
 class TestGoal:
     """A collection of methods for testing the sub-classes of Goal.
@@ -324,6 +980,20 @@ class TestGoal:
 
         assert result == flattened_board_16x16
 
+    def test_block_flatten_indices(self, board_16x16,
+                                   flattened_board_16x16) -> None:
+        """Test that the compact flatten gives a palette index for every unit
+        cell, in bytearray columns that are not the board's own grid.
+        """
+        result = _flatten(board_16x16, indices=True)
+
+        assert all(isinstance(column, bytearray) for column in result)
+        assert [[COLOUR_LIST[i] for i in column] for column in result] == \
+            flattened_board_16x16
+
+        result[0][0] = 3
+        assert board_16x16.unit_cells()[0][0] == 2
+
     def test_blob_goal(self, board_16x16) -> None:
         correct_scores = [
             (COLOUR_LIST[0], 1),
@@ -337,6 +1007,155 @@ class TestGoal:
             goal = BlobGoal(colour)
             assert goal.score(board_16x16) == expected
 
+    def test_blob_scores_match_flood_fill(self) -> None:
+        """Test that labelling all blobs at once finds the same largest blob
+        of each colour as flood filling from every cell.
+        """
+        random.seed(148)
+        for _ in range(10):
+            board = generate_board(random.randint(1, 5), 750)
+            scores = blob_scores(board)
+            cells = board.unit_cells()
+            for i, colour in enumerate(COLOUR_LIST):
+                goal = BlobGoal(colour)
+                visited = [[-1] * len(cells) for _ in cells]
+                assert scores[i] == max(
+                    goal._undiscovered_blob_size((x, y), cells, visited)
+                    for x in range(len(cells)) for y in range(len(cells)))
+
+    def test_blob_index_follows_actions(self) -> None:
+        """Test that the blob index of a board gives the same scores as
+        labelling the whole board again, through actions and undos.
+        """
+        random.seed(148)
+        board = generate_board(5, 750)
+        board.start_journal()
+        track_blobs(board)
+        goals = [BlobGoal(colour) for colour in COLOUR_LIST]
+        for _ in range(100):
+            if random.random() < 0.2:
+                board.undo()
+            else:
+                _random_action(_random_block(board))
+            assert [goal.score(board) for goal in goals] == \
+                _largest_blobs(board.unit_cells())[:len(goals)]
+
+    def test_leaf_blobs_match_unit_cells(self) -> None:
+        """Test that blobs found on the graph of leaves have the same sizes as
+        blobs found on unit cells, for whole boards and for single blocks.
+        """
+        random.seed(148)
+        for _ in range(10):
+            board = generate_board(random.randint(0, 6), 750)
+            for _ in range(10):
+                _random_action(_random_block(board))
+                block = _random_block(board)
+                assert blob_scores(board) == _largest_blobs(board._new_cells())
+                assert blob_scores(block) == \
+                    _largest_blobs(block.unit_cells())
+
+    def test_score_many_matches_score(self) -> None:
+        """Test that scoring a stack of flattened boards gives the same scores
+        as scoring each board.
+        """
+        boards = generate_seeded_boards(30, 4, 750, seed=148,
+                                        as_blocks=True)
+        grids = [_flatten(board, indices=True) for board in boards]
+        for colour in COLOUR_LIST:
+            for goal in [PerimeterGoal(colour), BlobGoal(colour)]:
+                assert goal.score_many(grids) == \
+                    [goal.score(board) for board in boards]
+
+    def test_upper_bound_after_one_move(self) -> None:
+        """Test that no single move takes a goal's score above its bound, and
+        that allowing more moves never lowers the bound.
+        """
+        for seed in range(10):
+            random.seed(seed)
+            board = generate_board(random.randint(0, 3), 750)
+            blocks = [board]
+            for block in blocks:
+                blocks.extend(block.children)
+            moves = []
+            for block in blocks:
+                for action, direction in [('rotate', 1), ('rotate', 3),
+                                          ('swap', 0), ('swap', 1),
+                                          ('smash', None), ('combine', None)]:
+                    moves.append(((action, direction, block), None))
+                for colour in COLOUR_LIST:
+                    moves.append((('paint', None, block), colour))
+            results = [board.after_move(move, colour)
+                       for move, colour in moves]
+
+            for colour in COLOUR_LIST:
+                for goal in [PerimeterGoal(colour), BlobGoal(colour)]:
+                    assert goal.upper_bound(board, 0) >= goal.score(board)
+                    bound = goal.upper_bound(board, 1)
+                    assert goal.upper_bound(board, 2) >= bound
+                    for result in results:
+                        if result is not None:
+                            assert goal.score(result) <= bound
+
+    def test_blob_goal_deep_board(self) -> None:
+        """Test that a blob covering a deep board is scored without reaching
+        the recursion limit.
+        """
+        board = Block((0, 0), 750, COLOUR_LIST[2], 0, 8)
+        goal = BlobGoal(COLOUR_LIST[2])
+        assert goal.score(board) == 2 ** 16
+
+        cells = board.unit_cells()
+        visited = [[-1] * len(cells) for _ in cells]
+        assert goal._undiscovered_blob_size((0, 0), cells, visited) == 2 ** 16
+
+    def test_undiscovered_blob_size_on_flattened_board(self) -> None:
+        """Test that a blob is found on a board flattened to palette indices,
+        and that no other colour is taken to be part of it.
+        """
+        board = Block((0, 0), 750, None, 0, 2)
+        set_children(board, [COLOUR_LIST[1], COLOUR_LIST[1], COLOUR_LIST[0],
+                             COLOUR_LIST[1]])
+        goal = BlobGoal(COLOUR_LIST[1])
+        cells = _flatten(board, indices=True)
+        visited = [[-1] * len(cells) for _ in cells]
+        assert goal._undiscovered_blob_size((0, 0), cells, visited) == 12
+        assert visited[0][2] == 0
+
+    def test_perimeter_scores_follow_actions(self) -> None:
+        """Test that perimeter scores from cached side counts match the edges
+        of the unit cell grid through actions and undos, and that an action
+        keeps the counts cached in the subtrees it did not touch on a board
+        that caches its summaries, and only on such a board.
+        """
+        random.seed(148)
+        board = generate_board(5, 750)
+        board.cache_summaries()
+        board.start_journal()
+        for _ in range(100):
+            if random.random() < 0.2:
+                board.undo()
+            else:
+                _random_action(_random_block(board))
+            cells = board.unit_cells()
+            edges = [cells[0], cells[-1], bytes(c[0] for c in cells),
+                     bytes(c[-1] for c in cells)]
+            assert perimeter_scores(board)[:4] == \
+                [sum(edge.count(i) for edge in edges) for i in range(4)]
+
+        board = Block((0, 0), 750, COLOUR_LIST[0], 0, 1)
+        board.smash()
+        perimeter_scores(board)
+        board.area_summary()
+        assert board._sides is None and board._areas is None
+        assert all(child._sides is None for child in board.children)
+
+        board.cache_summaries()
+        perimeter_scores(board)
+        leaf = board.children[0]
+        assert leaf.paint(COLOUR_LIST[(leaf._colour + 1) % 4])
+        assert board._sides is None
+        assert board.children[2]._sides is not None
+
     def test_perimeter_goal(self, board_16x16):
         correct_scores = [
             (COLOUR_LIST[0], 2),
@@ -350,6 +1169,270 @@ class TestGoal:
             goal = PerimeterGoal(colour)
             assert goal.score(board_16x16) == expected
 
+    def test_perimeter_scores_every_colour(self, board_16x16) -> None:
+        """Test that scoring all colours at once agrees with scoring each
+        colour's goal on its own.
+        """
+        assert perimeter_scores(board_16x16)[:4] == [2, 5, 4, 5]
+
+        random.seed(148)
+        board = generate_board(4, 750)
+        for _ in range(20):
+            _random_action(_random_block(board))
+            scores = perimeter_scores(board)
+            assert sum(scores) == 4 * 2 ** board.max_depth
+            for i, colour in enumerate(COLOUR_LIST):
+                assert scores[i] == PerimeterGoal(colour).score(board)
+
+
+class TestGameData:
+    """A collection of methods for testing GameData.
+    """
+
+    def test_calculate_scores(self, board_16x16) -> None:
+        """Test that scoring every player at once gives the same scores and
+        penalties as scoring each player on their own.
+        """
+        goals = [PerimeterGoal(COLOUR_LIST[1]), BlobGoal(COLOUR_LIST[3]),
+                 BlobGoal(COLOUR_LIST[1]), PerimeterGoal(COLOUR_LIST[0])]
+        players = [RandomPlayer(i, goals[i]) for i in range(len(goals))]
+        data = GameData(board_16x16, players)
+        data.smashes[1] = 1
+        data.paints[3] = 2
+
+        scores = data.calculate_scores()
+        assert scores == {player.id: data.calculate_score(player.id)
+                          for player in players}
+        assert scores[0] == (5, 0)
+        assert scores[1][0] == 5
+
+    def test_blobs_tracked_only_for_blob_goals(self) -> None:
+        """Test that the board only keeps an index of its blobs when some
+        player has a BlobGoal.
+        """
+        for goal, tracked in [(PerimeterGoal(COLOUR_LIST[0]), False),
+                              (BlobGoal(COLOUR_LIST[0]), True)]:
+            board = generate_board(3, 750)
+            GameData(board, [RandomPlayer(0, goal)])
+            watchers = {} if board._state is None else board._state.watchers
+            assert ('blobs' in watchers) == tracked
+
+    def test_scores_cached_until_board_changes(self, board_16x16) -> None:
+        """Test that scores are cached under the board's version, and that an
+        action on the board makes them be computed again.
+        """
+        players = [RandomPlayer(0, PerimeterGoal(COLOUR_LIST[1])),
+                   RandomPlayer(1, BlobGoal(COLOUR_LIST[1]))]
+        data = GameData(board_16x16, players)
+        version = board_16x16.version()
+
+        assert data.calculate_scores() == {0: (5, 0), 1: (4, 0)}
+        assert len(data._score_cache) == 2
+        assert data.calculate_score(1) == (4, 0)
+        assert board_16x16.version() == version
+        assert len(data._score_cache) == 2
+
+        board_16x16.children[0].combine()
+        assert board_16x16.version() != version
+        assert data.calculate_score(0) == \
+            (PerimeterGoal(COLOUR_LIST[1]).score(board_16x16), 0)
+        assert len(data._score_cache) == 3
+
+    def test_linear_board(self) -> None:
+        """Test that a board built by generate_linear_board is scored like
+        the same board as Blocks, and scored again after an action.
+        """
+        random.seed(148)
+        board = generate_linear_board(3, 750)
+        players = [RandomPlayer(0, PerimeterGoal(COLOUR_LIST[1])),
+                   RandomPlayer(1, BlobGoal(COLOUR_LIST[2]))]
+        data = GameData(board, players)
+        for _ in range(20):
+            expected = GameData(board.to_block(), players).calculate_scores()
+            assert data.calculate_scores() == expected
+            version = board.version()
+            move = board.random_move(COLOUR_LIST[1])
+            assert _make_move(move, COLOUR_LIST[1])
+            assert board.version() != version
+
+    def test_scores_cached_across_search(self) -> None:
+        """Test that a SmartPlayer trying out moves on the board, by making
+        and undoing them, leaves the cached scores usable.
+        """
+        random.seed(148)
+        board = generate_board(3, 750)
+        player = SmartPlayer(0, BlobGoal(COLOUR_LIST[0]), 10)
+        data = GameData(board, [player])
+        scores = data.calculate_scores()
+        version = board.version()
+
+        player._proceed = True
+        player.generate_move(board)
+        assert board.version() == version
+        assert data.calculate_scores() == scores
+        assert len(data._score_cache) == 1
+
+    def test_score_cache_is_bounded(self) -> None:
+        """Test that the score cache never holds more than SCORE_CACHE_SIZE
+        scores.
+        """
+        random.seed(148)
+        board = generate_board(3, 750)
+        data = GameData(board, [RandomPlayer(0, BlobGoal(COLOUR_LIST[0]))])
+        for _ in range(2 * SCORE_CACHE_SIZE):
+            _random_action(_random_block(board))
+            data.calculate_score(0)
+        assert len(data._score_cache) <= SCORE_CACHE_SIZE
+
+
+class TestQuadtree:
+    """A collection of methods for testing the LinearQuadtree board engine and
+    its QuadtreeBlock view.
+    """
+
+    def test_same_board_as_generate_board(self) -> None:
+        """Test that both engines build the same board from the same seed.
+        """
+        for seed in range(10):
+            random.seed(seed)
+            board = generate_board(4, 750)
+            random.seed(seed)
+            linear = generate_linear_board(4, 750)
+
+            assert linear == board
+            assert linear.tree.to_block() == board
+
+    def test_seeded_boards_can_be_regenerated(self) -> None:
+        """Test that every board from generate_seeded_boards can be
+        regenerated from its own seed, without touching the global random
+        state.
+        """
+        random.seed(148)
+        state = random.getstate()
+        boards = generate_seeded_boards(10, 4, 750, seed=100,
+                                        as_blocks=True)
+        assert random.getstate() == state
+
+        for i, board in enumerate(boards):
+            random.seed(100 + i)
+            assert generate_board(4, 750) == board
+            assert generate_linear_board(4, 750, random.Random(100 + i)) \
+                == board
+
+    def test_swap0(self, board_16x16, board_16x16_swap0) -> None:
+        """Test that swapping a view moves the children and their positions.
+        """
+        view = LinearQuadtree.from_block(board_16x16).root()
+
+        assert view.swap(0)
+        assert view == board_16x16_swap0
+
+    def test_rotate1(self, board_16x16, board_16x16_rotate1) -> None:
+        """Test that rotating a view rotates the subtree below it.
+        """
+        view = LinearQuadtree.from_block(board_16x16).root()
+
+        assert view.children[0].rotate(1)
+        assert view == board_16x16_rotate1
+
+    def test_same_actions_as_block(self) -> None:
+        """Test that a view and a Block stay equal, positions included, while
+        the same random actions are performed on both.
+        """
+        random.seed(148)
+        board = generate_board(4, 750)
+        view = LinearQuadtree.from_block(board).root()
+        for _ in range(200):
+            block = _random_block(board)
+            path = board._path_to(block)
+            view_block = view
+            for parent, child in zip(path, path[1:]):
+                view_block = view_block.children[parent._child_index(child)]
+
+            seed = random.random()
+            random.seed(seed)
+            done = _random_action(block)
+            random.seed(seed)
+            assert _random_action(view_block) == done
+            assert view == board
+
+    def test_combine_then_smash_reuses_nodes(self, board_16x16) -> None:
+        """Test that smashing after a combine reuses the freed group of nodes.
+        """
+        tree = LinearQuadtree.from_block(board_16x16)
+        view = tree.root()
+        count = len(tree.colours)
+
+        assert view.children[0].combine()
+        assert view.children[0].colour == COLOUR_LIST[1]
+        assert tree.node_count() == count - 4
+        assert view.children[1].smash()
+        assert len(tree.colours) == count
+        assert tree.node_count() == count
+
+    def test_block_to_squares(self, board_16x16) -> None:
+        """Test that a view can be drawn like a Block.
+        """
+        view = LinearQuadtree.from_block(board_16x16).root()
+
+        assert set(_block_to_squares(view)) == \
+               set(_block_to_squares(board_16x16))
+
+    def test_valid_moves_match_block(self) -> None:
+        """Test that a view lists the same valid moves as a Block.
+        """
+        random.seed(148)
+        for _ in range(10):
+            board = generate_board(4, 750)
+            view = LinearQuadtree.from_block(board).root()
+            for colour in COLOUR_LIST:
+                moves = {(move[0], move[1], move[2].position, move[2].level)
+                         for move in view.valid_moves(colour)}
+                assert moves == {(move[0], move[1], move[2].position,
+                                  move[2].level)
+                                 for move in board.valid_moves(colour)}
+
+    def test_random_moves_match_block(self) -> None:
+        """Test that a view draws its random moves from the same moves as a
+        Block, including rotates and swaps that change nothing.
+        """
+        board = Block((0, 0), 750, None, 0, 1)
+        board.children = [Block(position, 375, COLOUR_LIST[0], 1, 1)
+                          for position in board._children_positions()]
+        view = LinearQuadtree.from_block(board).root()
+        rng = random.Random(148)
+
+        drawn = set()
+        for _ in range(200):
+            for move in (board.random_move(COLOUR_LIST[1], rng),
+                         view.random_move(COLOUR_LIST[1], rng)):
+                drawn.add((type(move[2]), move[0], move[1],
+                           move[2].position))
+        for kind in (Block, QuadtreeBlock):
+            assert {move[1:3] for move in drawn if move[0] is kind} == \
+                {('rotate', 1), ('rotate', 3), ('swap', 0), ('swap', 1),
+                 ('combine', None), ('paint', None)}
+        assert len(drawn) == 2 * 9
+
+    def test_copy_of_sub_block(self, board_16x16) -> None:
+        """Test that copying a sub-block of a view keeps its level, position
+        and max_depth, as Block.create_copy does.
+        """
+        board_16x16.children[0].smash()
+        view = LinearQuadtree.from_block(board_16x16).root()
+        for i in range(4):
+            block = board_16x16.children[i]
+            copy = view.children[i].create_copy()
+
+            assert copy == block.create_copy()
+            assert copy.tree.to_block() == block.create_copy()
+            assert LinearQuadtree.from_block(block).root() == block
+        grandchild = view.children[0].children[2]
+        copy = grandchild.create_copy()
+        assert copy == board_16x16.children[0].children[2]
+        assert copy.position == grandchild.position
+        assert copy.level == 2
+
 
 if __name__ == '__main__':
     pytest.main(['example_tests.py'])
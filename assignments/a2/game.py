@@ -77,6 +77,8 @@ class Game:
             # Process events
             for e in pygame.event.get():
                 if e.type == pygame.QUIT:
+                    for player in self._data.players:
+                        player.close()
                     return
                 else:
                     self._state.process_event(e)
@@ -22,11 +22,13 @@ Misha Schwartz, and Jaisie Sin
 This file contains the hierarchy of Goal classes.
 """
 from __future__ import annotations
+import itertools
 import math
 import random
-from typing import List, Tuple
-from block import Block
-from settings import colour_name, COLOUR_LIST
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from block import Block, LEFT, RIGHT, TOP, BOTTOM
+from settings import colour_name, colour_index, palette_colours, \
+    COLOUR_LIST, PALETTE
 
 
 def generate_goals(num_goals: int) -> List[Goal]:
@@ -43,7 +45,7 @@ def generate_goals(num_goals: int) -> List[Goal]:
     # COLOUR_LIST has 4 colors. so num_goals <= 4
     x = random.randint(0, 1)
     goal_lst = []
-    num_lst = [0, 1, 2, 3]
+    num_lst = list(range(len(COLOUR_LIST)))
 
     for i in range(num_goals):
         index = random.choice(num_lst)
@@ -58,7 +60,8 @@ def generate_goals(num_goals: int) -> List[Goal]:
     return goal_lst
 
 
-def _flatten(block: Block) -> List[List[Tuple[int, int, int]]]:
+def _flatten(block: Block, indices: bool = False) -> \
+        Union[List[List[Tuple[int, int, int]]], List[bytearray]]:
     """Return a two-dimensional list representing <block> as rows and columns of
     unit cells.
 
@@ -70,83 +73,416 @@ def _flatten(block: Block) -> List[List[Tuple[int, int, int]]]:
     Each unit cell is represented by a tuple of 3 ints, which is the colour
     of the block at the cell location[i][j]
 
+    If <indices> is True, each L[i] is instead a bytearray, and each unit cell
+    is the index of its colour in settings.PALETTE. This is the compact form
+    the goals score and Renderer.draw_cells draws.
+
     L[0][0] represents the unit cell in the upper left corner of the Block.
     """
     # TODO: Implement me
-    lst_blocks = _create_list_blocks(block)
-    big_lst = []
-    x = 0
-    for i in range(pow(2, block.max_depth - block.level)):
-        small_lst = []
-        y = 0
+    # The board keeps its own grid of palette indices; copy it, or resolve
+    # the indices to RGB, so that the cached grid is never handed out.
+    if indices:
+        return [column[:] for column in block.unit_cells()]
+    return [palette_colours(column) for column in block.unit_cells()]
+
+
+def perimeter_scores(board: Block) -> List[int]:
+    """Return the PerimeterGoal score of every colour on <board>, indexed by
+    the colour's index in settings.PALETTE.
+
+    Each unit cell on an edge of <board> counts once for every edge it is on,
+    so corner cells count twice.
+
+    >>> board = Block((0, 0), 750, COLOUR_LIST[1], 0, 1)
+    >>> perimeter_scores(board)[:4]
+    [0, 8, 0, 0]
+    """
+    counts = _perimeter_counts(board)
+    return [counts.get(i, 0) for i in range(len(PALETTE))]
 
-        _fill_inner_lst(block, lst_blocks, small_lst, x, y)
 
-        big_lst.append(small_lst)
+def blob_scores(board: Block) -> List[int]:
+    """Return the BlobGoal score of every colour on <board>, indexed by the
+    colour's index in settings.PALETTE.
 
-        x += block.size / pow(2, block.max_depth - block.level)
+    A board passed to track_blobs is scored from its blob index. Any other
+    Block is scored from the graph of its leaves, at a cost that grows with
+    the number of leaves rather than of unit cells.
 
-    tuple_lst = []
-    for i in range(len(big_lst)):
-        col_lst = []
+    >>> board = Block((0, 0), 750, COLOUR_LIST[1], 0, 1)
+    >>> blob_scores(board)[:4]
+    [0, 4, 0, 0]
+    """
+    if not isinstance(board, Block):
+        return _largest_blobs(board.unit_cells())
 
-        for j in range(len(big_lst[i])):
-            col_lst.append(big_lst[i][j].colour)
+    index = board.cell_watcher('blobs') if board.level == 0 else None
+    if index is None:
+        return _leaf_blobs(board)
+    return [index.largest(i) for i in range(len(PALETTE))]
 
-        tuple_lst.append(col_lst)
 
-    return tuple_lst
+def track_blobs(board: Block) -> None:
+    """Keep an index of the blobs on <board> from now on, so that after each
+    action BlobGoal only relabels the blobs the action touched.
 
+    This pays off for a board that is changed and scored over and over, like
+    the board of a game, rather than for boards scored once.
 
-# helper functions
-def _fill_inner_lst(block: Block, lst_blocks: List[Block],
-                    small_lst: List[Block], x: int, y: int) -> None:
-    """Add the appropriate blocks from <lst_blocks> to <small_lst>.
+    Boards that are not Blocks have no cells to watch, and are left as they
+    are.
 
-    :param block:
-    :param lst_blocks:
-    :param small_lst:
-    :return:
+    Precondition: <board> is the root of its board.
     """
-    while len(small_lst) < pow(2, block.max_depth - block.level):
-        for b in lst_blocks:
-            if _location_in_block(b, (x, y)):
-                small_lst.append(b)
-                return None
+    if isinstance(board, Block):
+        board.cell_watcher('blobs', _BlobIndex)
+
 
-        y += block.size / pow(2, block.max_depth - block.level)
+def goal_scores(board: Block, goals: List[Goal]) -> List[int]:
+    """Return the score of each goal in <goals> on <board>, in the same order.
 
+    All the perimeter goals are scored together from one read of the edges of
+    <board>, and all the blob goals from one labelling of its blobs, however
+    many goals and colours there are.
 
-def _create_list_blocks(block: Block) -> List[Block]:
-    """Return a list of all the Blocks that need to be drawn in order to create
-    <block>. (all the leaves of the tree)
-    :param block:
-    :return:
+    >>> board = Block((0, 0), 750, COLOUR_LIST[1], 0, 1)
+    >>> goal_scores(board, [PerimeterGoal(COLOUR_LIST[1]),
+    ...                     BlobGoal(COLOUR_LIST[0]), BlobGoal(COLOUR_LIST[1])])
+    [8, 0, 4]
     """
-    if block.children == []:
-        return [block]
-    else:
-        lst = []
-        for child in block.children:
-            lst.extend(_create_list_blocks(child))
+    perimeter = None
+    blobs = None
+    scores = []
+    for goal in goals:
+        if isinstance(goal, PerimeterGoal):
+            if perimeter is None:
+                perimeter = perimeter_scores(board)
+            scores.append(perimeter[goal._colour_index])
+        elif isinstance(goal, BlobGoal):
+            if blobs is None:
+                blobs = blob_scores(board)
+            scores.append(blobs[goal._colour_index])
+        else:
+            scores.append(goal.score(board))
+
+    return scores
+
+
+class _BlobIndex:
+    """The blobs of every colour in a board's grid of unit cells, kept up to
+    date through Block.cell_watcher.
+
+    When part of the grid is repainted, only the blobs that had a cell in or
+    next to the repainted squares are labelled again, so the work done is
+    proportional to the size of those blobs rather than of the board.
+
+    === Private Attributes ===
+    _width:
+        The number of unit cells along each side of the grid.
+    _colours:
+        The palette index of every unit cell, with the cell at column i and
+        row j at index i * _width + j.
+    _labels:
+        The label of the blob each unit cell is in, parallel to <_colours>,
+        or -1 while the cell is being labelled again.
+    _members:
+        The unit cells in each blob, by label.
+    _blob_colours:
+        The palette index of the colour of each blob, by label.
+    _sizes:
+        _sizes[c][n] is the number of blobs of colour c with n unit cells.
+    _next_label:
+        The label the next blob found will get.
+    """
+    _width: int
+    _colours: bytearray
+    _labels: List[int]
+    _members: Dict[int, List[int]]
+    _blob_colours: Dict[int, int]
+    _sizes: Dict[int, Dict[int, int]]
+    _next_label: int
+
+    def __init__(self, cells: List[bytearray]) -> None:
+        """Initialize this index with the blobs in <cells>, a grid in the
+        format of Block.unit_cells.
+        """
+        self._width = len(cells)
+        self._colours = bytearray(b''.join(cells))
+        self._labels = [-1] * len(self._colours)
+        self._members = {}
+        self._blob_colours = {}
+        self._sizes = {}
+        self._next_label = 0
+        self._label(range(len(self._colours)))
+
+    def largest(self, colour: int) -> int:
+        """Return the number of unit cells in the largest blob whose colour is
+        PALETTE[<colour>], or 0 if there is none.
+        """
+        sizes = self._sizes.get(colour)
+        return max(sizes) if sizes else 0
 
-        return lst
+    def cells_changed(self, cells: List[bytearray],
+                      regions: List[Tuple[int, int, int]]) -> None:
+        """Update this index now that each (column, row, width) square in
+        <regions> of <cells> has been repainted.
+        """
+        width = self._width
+        affected = set()
+        for column, row, size in regions:
+            for i in range(column, column + size):
+                start = i * width + row
+                self._colours[start:start + size] = cells[i][row:row + size]
+            # A blob that touches the square from outside can merge with it.
+            top = max(row - 1, 0)
+            bottom = min(row + size + 1, width)
+            for i in range(max(column - 1, 0), min(column + size + 1, width)):
+                affected.update(self._labels[i * width + top:
+                                             i * width + bottom])
+
+        area = []
+        for label in affected:
+            members = self._members.pop(label)
+            colour = self._blob_colours.pop(label)
+            counts = self._sizes[colour]
+            counts[len(members)] -= 1
+            if counts[len(members)] == 0:
+                del counts[len(members)]
+            for cell in members:
+                self._labels[cell] = -1
+            area.extend(members)
+
+        self._label(area)
+
+    def _label(self, area: Iterable[int]) -> None:
+        """Find and record the blobs made of the unit cells in <area>.
+
+        Precondition: the cells in <area> are exactly the cells labelled -1,
+        and no blob contains both a cell in <area> and a cell outside it.
+        """
+        width = self._width
+        colours = self._colours
+        labels = self._labels
+        for start in area:
+            if labels[start] != -1:
+                continue
+
+            label = self._next_label
+            self._next_label += 1
+            colour = colours[start]
+            labels[start] = label
+            members = [start]
+            # <members> grows while it is walked, breadth first.
+            for cell in members:
+                row = cell % width
+                neighbours = []
+                if cell >= width:
+                    neighbours.append(cell - width)
+                if cell + width < len(colours):
+                    neighbours.append(cell + width)
+                if row > 0:
+                    neighbours.append(cell - 1)
+                if row < width - 1:
+                    neighbours.append(cell + 1)
+                for neighbour in neighbours:
+                    if labels[neighbour] == -1 and \
+                            colours[neighbour] == colour:
+                        labels[neighbour] = label
+                        members.append(neighbour)
+
+            self._members[label] = members
+            self._blob_colours[label] = colour
+            counts = self._sizes.setdefault(colour, {})
+            counts[len(members)] = counts.get(len(members), 0) + 1
+
+
+# helper
+def _leaf_blobs(block: Block) -> List[int]:
+    """Return the size in unit cells of the largest blob of each colour in
+    <block>, indexed by palette index, working on leaves instead of unit
+    cells.
+
+    Every leaf is one node of a graph, weighted by its area. Bottom up, each
+    Block joins the leaves of its children that meet across the two lines
+    between its quadrants, in a union-find forest.
+    """
+    parents = []
+    colours = []
+    areas = []
+
+    def visit(node: Block, width: int) -> List[List[Tuple[int, int, int]]]:
+        """Add the leaves of <node>, whose sides are <width> unit cells long,
+        to the forest. Return the leaves along its LEFT, RIGHT, TOP and BOTTOM
+        sides, in that order, each as (start, end, leaf) in unit cells along
+        the side, from the top or from the left.
+        """
+        children = node.children
+        if children == []:
+            leaf = len(parents)
+            parents.append(leaf)
+            colours.append(node._colour)
+            areas.append(width * width)
+            side = [(0, width, leaf)]
+            return [side, side, side, side]
+
+        half = width // 2
+        upper_right, upper_left, lower_left, lower_right = \
+            [visit(child, half) for child in children]
+        _join_seam(parents, colours, upper_left[RIGHT], upper_right[LEFT])
+        _join_seam(parents, colours, lower_left[RIGHT], lower_right[LEFT])
+        _join_seam(parents, colours, upper_left[BOTTOM], lower_left[TOP])
+        _join_seam(parents, colours, upper_right[BOTTOM], lower_right[TOP])
+
+        sides = [[], [], [], []]
+        for side, first, second in [(LEFT, upper_left, lower_left),
+                                    (RIGHT, upper_right, lower_right),
+                                    (TOP, upper_left, upper_right),
+                                    (BOTTOM, lower_left, lower_right)]:
+            sides[side] = first[side] + [(start + half, end + half, leaf)
+                                         for start, end, leaf in second[side]]
+        return sides
+
+    visit(block, 2 ** (block.max_depth - block.level))
+
+    sizes = [0] * len(parents)
+    for leaf in range(len(parents)):
+        sizes[_find(parents, leaf)] += areas[leaf]
+    best = [0] * len(PALETTE)
+    for leaf in range(len(parents)):
+        if parents[leaf] == leaf and sizes[leaf] > best[colours[leaf]]:
+            best[colours[leaf]] = sizes[leaf]
+
+    return best
+
+
+# helper
+def _join_seam(parents: List[int], colours: List[int],
+               first: List[Tuple[int, int, int]],
+               second: List[Tuple[int, int, int]]) -> None:
+    """Join the leaves of the same colour that face each other across a seam
+    in the union-find forest <parents>, where <first> and <second> are the
+    leaves on either side of it as (start, end, leaf), in order along it.
+    """
+    i = 0
+    j = 0
+    while i < len(first) and j < len(second):
+        a = first[i][2]
+        b = second[j][2]
+        if colours[a] == colours[b]:
+            _union(parents, a, b)
+        # Move past whichever leaf ends first; both if they end together.
+        end = min(first[i][1], second[j][1])
+        if first[i][1] == end:
+            i += 1
+        if second[j][1] == end:
+            j += 1
+
+
+# helper
+def _largest_blobs(cells: List[bytearray],
+                   only: Optional[int] = None) -> List[int]:
+    """Return the size of the largest blob of each colour in <cells>, a grid in
+    the format of Block.unit_cells, indexed by palette index.
+
+    Each column is split into runs of cells of one colour, and runs of the
+    same colour that touch in neighbouring columns are joined with a
+    union-find forest, so every blob of every colour is found in one pass
+    without recursion. If <only> is not None, only the blobs of the colour
+    with that palette index are measured, and every other size is 0.
+    """
+    parents = []
+    colours = []
+    lengths = []
+    previous = []
+    for column in cells:
+        current = []
+        start = 0
+        for colour, run_cells in itertools.groupby(column):
+            end = start + len(list(run_cells))
+            if only is not None and colour != only:
+                start = end
+                continue
+            run = len(parents)
+            parents.append(run)
+            colours.append(colour)
+            lengths.append(end - start)
+            current.append((start, end, run))
+            start = end
+
+        # Runs of the previous column that end before a run starts cannot
+        # touch it or any run below it.
+        k = 0
+        for start, end, run in current:
+            while k < len(previous) and previous[k][1] <= start:
+                k += 1
+            m = k
+            while m < len(previous) and previous[m][0] < end:
+                other = previous[m][2]
+                if colours[other] == colours[run]:
+                    _union(parents, run, other)
+                m += 1
+        previous = current
+
+    sizes = [0] * len(parents)
+    for run in range(len(parents)):
+        sizes[_find(parents, run)] += lengths[run]
+    best = [0] * len(PALETTE)
+    for run in range(len(parents)):
+        if parents[run] == run and sizes[run] > best[colours[run]]:
+            best[colours[run]] = sizes[run]
+
+    return best
+
+
+# helper
+def _find(parents: List[int], item: int) -> int:
+    """Return the root of the tree containing <item> in the union-find forest
+    <parents>, halving the path to it on the way.
+    """
+    while parents[item] != item:
+        parents[item] = parents[parents[item]]
+        item = parents[item]
+    return item
 
 
-def _location_in_block(block: Block, location: Tuple[int, int]) -> bool:
-    """Return True if <location> is in <block>. Return False otherwise.
-    :param block:
-    :param location:
-    :return:
+# helper
+def _union(parents: List[int], a: int, b: int) -> None:
+    """Join the trees containing <a> and <b> in the union-find forest
+    <parents>.
     """
-    block_x = block.position[0]
-    block_y = block.position[1]
-    loc_x = location[0]
-    loc_y = location[1]
-    if block_x <= loc_x < block_x + block.size and \
-            block_y <= loc_y < block_y + block.size:
-        return True
-    return False
+    root_a = _find(parents, a)
+    root_b = _find(parents, b)
+    if root_a != root_b:
+        parents[max(root_a, root_b)] = min(root_a, root_b)
+
+
+# The sides of the board that each child of a Block lies along, in the order
+# of Block.children.
+_OUTER_SIDES = [(TOP, RIGHT), (TOP, LEFT), (BOTTOM, LEFT), (BOTTOM, RIGHT)]
+
+
+# helper
+def _perimeter_counts(board: Block) -> Dict[int, int]:
+    """Return a dictionary from the palette index of each colour on the edges
+    of <board> to its PerimeterGoal score.
+
+    A Block is scored from the cached side counts of the blocks along its
+    edges, without building its grid of unit cells.
+    """
+    counts = {}
+    if isinstance(board, Block):
+        for side in (LEFT, RIGHT, TOP, BOTTOM):
+            for colour, count in board.side_counts(side).items():
+                counts[colour] = counts.get(colour, 0) + count
+    else:
+        cells = board.unit_cells()
+        for edge in [cells[0], cells[-1], bytes(column[0] for column in cells),
+                     bytes(column[-1] for column in cells)]:
+            for colour in edge:
+                counts[colour] = counts.get(colour, 0) + 1
+
+    return counts
 
 
 class Goal:
@@ -158,14 +494,31 @@ class Goal:
     colour:
         The target colour for this goal, that is the colour to which
         this goal applies.
+
+    === Private Attributes ===
+    _colour_index:
+        The index of <colour> in settings.PALETTE, which is what the unit
+        cells of a board are compared against.
     """
-    colour: Tuple[int, int, int]
+    _colour_index: int
 
     def __init__(self, target_colour: Tuple[int, int, int]) -> None:
         """Initialize this goal to have the given target colour.
         """
         self.colour = target_colour
 
+    @property
+    def colour(self) -> Tuple[int, int, int]:
+        """The target colour for this goal.
+        """
+        return PALETTE[self._colour_index]
+
+    @colour.setter
+    def colour(self, colour: Tuple[int, int, int]) -> None:
+        """Set the target colour for this goal to <colour>.
+        """
+        self._colour_index = colour_index(colour)
+
     def score(self, board: Block) -> int:
         """Return the current score for this goal on the given board.
 
@@ -173,6 +526,29 @@ class Goal:
         """
         raise NotImplementedError
 
+    def score_many(self, grids: Iterable[List[bytearray]]) -> List[int]:
+        """Return the score for this goal on each board in <grids>, in order.
+
+        Each board is given as its flattened grid of palette indices, as
+        returned by _flatten(board, indices=True) or Block.unit_cells, so a
+        stack of boards can be scored without building their trees.
+        """
+        raise NotImplementedError
+
+    def upper_bound(self, board: Block, moves: int) -> int:
+        """Return a number that the score for this goal on <board> cannot
+        exceed after at most <moves> more moves, whatever they are.
+
+        The bound is worked out from summaries cached in the tree, without
+        scoring <board>, so that a search can skip positions whose bound is no
+        better than the best score it has already found.
+
+        Preconditions:
+            - moves >= 0
+            - <board> is a Block
+        """
+        raise NotImplementedError
+
     def description(self) -> str:
         """Return a description of this goal.
         """
@@ -183,24 +559,55 @@ class PerimeterGoal(Goal):
 
     def score(self, board: Block) -> int:
         # TODO: Implement me
-        lst_lst_tup = _flatten(board)
-        score = 0
-        for i in range(len(lst_lst_tup)):
-            for j in range(len(lst_lst_tup[i])):
-                if lst_lst_tup[i][j] == self.colour:
-                    score += 1
-        # corners
-        max_index = pow(2, board.max_depth) - 1
-        if lst_lst_tup[0][0] == self.colour:
-            score += 1
-        if lst_lst_tup[0][max_index]:
-            score += 1
-        if lst_lst_tup[max_index][0]:
-            score += 1
-        if lst_lst_tup[max_index][max_index]:
-            score += 1
-
-        return score
+        # Corner cells are on two edges, so they are counted twice.
+        return _perimeter_counts(board).get(self._colour_index, 0)
+
+    def score_many(self, grids: Iterable[List[bytearray]]) -> List[int]:
+        target = self._colour_index
+        scores = []
+        for cells in grids:
+            # The top and bottom rows are gathered into bytes so that every
+            # edge is counted by bytes.count.
+            scores.append(cells[0].count(target) + cells[-1].count(target) +
+                          bytes(column[0] for column in cells).count(target) +
+                          bytes(column[-1] for column in cells).count(target))
+        return scores
+
+    def upper_bound(self, board: Block, moves: int) -> int:
+        width = 2 ** (board.max_depth - board.level)
+        children = board.children
+        if moves > 0 and (children == [] or
+                          board.level >= board.max_depth - 1):
+            # One smash, paint or combine can recolour the whole board.
+            return 4 * width
+        if children == []:
+            return self.score(board)
+
+        # Each quadrant holds perimeter cells worth <width> at most. A move
+        # inside a quadrant only changes that quadrant. Rotating or swapping
+        # the whole board moves quadrants around, after which a quadrant no
+        # move has been made in shows two of its own sides at best.
+        target = self._colour_index
+        current = 0
+        best = 0
+        shortfalls = []
+        best_shortfalls = []
+        for child, sides in zip(children, _OUTER_SIDES):
+            counts = [child.side_counts(side).get(target, 0)
+                      for side in (LEFT, RIGHT, TOP, BOTTOM)]
+            score = counts[sides[0]] + counts[sides[1]]
+            best_score = max(counts[a] + counts[b] for a, b in _OUTER_SIDES)
+            current += score
+            best += best_score
+            shortfalls.append(width - score)
+            best_shortfalls.append(width - best_score)
+        shortfalls.sort(reverse=True)
+        best_shortfalls.sort(reverse=True)
+
+        bound = current + sum(shortfalls[:moves])
+        if moves > 0:
+            bound = max(bound, best + sum(best_shortfalls[:moves - 1]))
+        return bound
 
     def description(self) -> str:
         # TODO: Implement me
@@ -211,22 +618,28 @@ class PerimeterGoal(Goal):
 class BlobGoal(Goal):
     def score(self, board: Block) -> int:
         # TODO: Implement me
-        brd = _flatten(board)
-        v = []
-        for i in range(len(brd)):
-            lst = []
-            for j in range(len(brd)):
-                lst.append(-1)
-            v.append(lst)
-        scores = []
-        for i in range(len(brd)):
-            for j in range(len(brd)):
-                s = self._undiscovered_blob_size((i, j), brd, v)
-                scores.append(s)
-        return max(scores)
+        return blob_scores(board)[self._colour_index]
+
+    def score_many(self, grids: Iterable[List[bytearray]]) -> List[int]:
+        # Runs of other colours are skipped, so only this goal's colour is
+        # labelled on each board.
+        target = self._colour_index
+        return [_largest_blobs(cells, target)[target] for cells in grids]
+
+    def upper_bound(self, board: Block, moves: int) -> int:
+        # A blob is never bigger than the area of its colour. Rotating and
+        # swapping keep that area, so only a smash, paint or combine can add
+        # to it, and by no more than the area it recolours.
+        areas, smashable = board.area_summary()
+        bound = areas.get(self._colour_index, 0)
+        if moves > 0:
+            combinable = 4 if board.level < board.max_depth else 1
+            bound += moves * max(smashable, combinable)
+
+        return min(bound, 4 ** (board.max_depth - board.level))
 
     def _undiscovered_blob_size(self, pos: Tuple[int, int],
-                                board: List[List[Tuple[int, int, int]]],
+                                board: List[bytearray],
                                 visited: List[List[int]]) -> int:
         """Return the size of the largest connected blob that (a) is of this
         Goal's target colour, (b) includes the cell at <pos>, and (c) involves
@@ -234,7 +647,9 @@ class BlobGoal(Goal):
 
         If <pos> is out of bounds for <board>, return 0.
 
-        <board> is the flattened board on which to search for the blob.
+        <board> is the flattened board on which to search for the blob, as
+        returned by _flatten(board, indices=True), with each unit cell given
+        as the index of its colour in settings.PALETTE.
         <visited> is a parallel structure that, in each cell, contains:
             -1 if this cell has never been visited
             0  if this cell has been visited and discovered
@@ -246,25 +661,23 @@ class BlobGoal(Goal):
         either 0 or 1.
         """
         # TODO: Implement me
-        sc = 1
-        i = pos[0]
-        j = pos[1]
-        if board[i][j] != self.colour:
-            visited[i][j] = 0
-            return 0
-        if 0 >= i > len(board) or 0 >= j > len(board):
-            return 0
-        visited[i][j] = 1
-        for n in range(4):
-            if n == 0 and i + 1 < len(board) and visited[i + 1][j] == -1:
-                sc += self._undiscovered_blob_size((i + 1, j), board, visited)
-            if n == 1 and i + 1 < len(board) and visited[i][j + 1] == -1:
-                sc += self._undiscovered_blob_size((i, j + 1), board, visited)
-            if n == 2 and i - 1 >= 0 and visited[i - 1][j] == -1:
-                sc += self._undiscovered_blob_size((i - 1, j), board, visited)
-            if n == 3 and j - 1 >= 0 and visited[i][j - 1] == -1:
-                sc += self._undiscovered_blob_size((i, j - 1), board, visited)
-        return sc
+        # An explicit stack instead of recursion, so that large blobs do not
+        # reach the recursion limit.
+        target = self._colour_index
+        size = 0
+        stack = [pos]
+        while stack:
+            i, j = stack.pop()
+            if not (0 <= i < len(board) and 0 <= j < len(board[i])) or \
+                    visited[i][j] != -1:
+                continue
+            if board[i][j] != target:
+                visited[i][j] = 0
+                continue
+            visited[i][j] = 1
+            size += 1
+            stack.extend([(i + 1, j), (i, j + 1), (i - 1, j), (i, j - 1)])
+        return size
 
     def description(self) -> str:
         # TODO: Implement me
@@ -278,7 +691,7 @@ if __name__ == '__main__':
     python_ta.check_all(config={
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing', 'block', 'settings',
-            'math', '__future__'
+            'math', 'itertools', '__future__'
         ],
         'max-attributes': 15
     })
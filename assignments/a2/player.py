@@ -23,14 +23,27 @@ This file contains the hierarchy of player classes.
 """
 from __future__ import annotations
 from typing import List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import math
 import random
+import time
 import pygame
 
 from block import Block
-from goal import Goal, generate_goals
+from goal import BlobGoal, Goal, generate_goals, track_blobs
+from settings import PALETTE
 
 from actions import KEY_ACTION, ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE, \
-    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PASS, PAINT, COMBINE
+    SWAP_HORIZONTAL, SWAP_VERTICAL, SMASH, PASS, PAINT, COMBINE, \
+    ACTION_PENALTY
+
+# A move as SmartPlayer sends it to another process: the action, the
+# direction, the (x, y) position of the moved block relative to the board,
+# its level, and the seed for the random numbers the move uses.
+_Candidate = Tuple[str, Optional[int], int, int, int, int]
+
+# PASS as a candidate, for the search of an MCTSPlayer.
+_PASS_CANDIDATE = (PASS[0], PASS[1], 0, 0, 0, 0)
 
 
 def create_players(num_human: int, num_random: int, smart_players: List[int]) \
@@ -86,36 +99,7 @@ def _get_block(block: Block, location: Tuple[int, int], level: int) -> \
         - 0 <= level <= max_depth
     """
     # TODO: Implement me
-    if block.children == [] or level == 0:  # Tree with 1 node
-        if _has_it(block, location):
-            return block
-        return None
-
-    for child in block.children:
-        if _has_it(child, location):
-            if child.level == level:
-                return child
-            else:
-                return _get_block(child, location, level)
-
-    return None
-
-
-# helper function
-def _has_it(block: Block, location: Tuple[int, int]) -> bool:
-    """Return True if <location> is in <block>. Return False otherwise.
-    :param block:
-    :param location:
-    :return:
-    """
-    block_x = block.position[0]
-    block_y = block.position[1]
-    loc_x = location[0]
-    loc_y = location[1]
-    if block_x <= loc_x < block_x + block.size and \
-            block_y <= loc_y < block_y + block.size:
-        return True
-    return False
+    return block.locate(location, level)
 
 
 class Player:
@@ -163,12 +147,42 @@ class Player:
         """
         raise NotImplementedError
 
+    def close(self) -> None:
+        """Release anything this player holds on to between moves, such as
+        other processes. The player makes no more moves after this.
+        """
+        return
+
 
 def _create_move(action: Tuple[str, Optional[int]], block: Block) -> \
         Tuple[str, Optional[int], Block]:
     return action[0], action[1], block
 
 
+# helper
+def _make_move(move: Tuple[str, Optional[int], Block],
+               colour: Tuple[int, int, int]) -> bool:
+    """Make <move> on the board that its Block is in, painting <colour> if it
+    is a paint move, and return whether the move was made.
+    """
+    action = (move[0], move[1])
+    direction = move[1]
+    block = move[2]
+
+    if action in [ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE]:
+        return block.rotate(direction)
+    elif action in [SWAP_HORIZONTAL, SWAP_VERTICAL]:
+        return block.swap(direction)
+    elif action == SMASH:
+        return block.smash()
+    elif action == PAINT:
+        return block.paint(colour)
+    elif action == COMBINE:
+        return block.combine()
+
+    return False
+
+
 class HumanPlayer(Player):
     """A human player.
     """
@@ -264,16 +278,18 @@ class RandomPlayer(Player):
         """Return a valid, randomly generated move.
 
         A valid move is a move other than PASS that can be successfully
-        performed on the <board>.
+        performed on the <board>. If there is none, this player will pass.
 
         This function does not mutate <board>.
         """
         if not self._proceed:
             return None  # Do not remove
 
-        # TODO: Implement Me
+        move = board.random_move(self.goal.colour)
         self._proceed = False  # Must set to False before returning!
-        return None  # FIXME
+        if move is None:
+            return _create_move(PASS, board)
+        return move
 
 
 class SmartPlayer(Player):
@@ -281,11 +297,31 @@ class SmartPlayer(Player):
     # _proceed:
     #   True when the player should make a move, False when the player should
     #   wait.
+    # _difficulty:
+    #   The number of valid moves this player assesses before choosing one.
+    # _workers:
+    #   The number of processes that assess the moves, or 0 if they are
+    #   assessed in this process.
+    # _pool:
+    #   The processes that assess the moves, or None if they have not been
+    #   started yet. They are kept from one move to the next until close()
+    #   is called.
     _proceed: bool
-
-    def __init__(self, player_id: int, goal: Goal, difficulty: int) -> None:
+    _difficulty: int
+    _workers: int
+    _pool: Optional[ProcessPoolExecutor]
+
+    def __init__(self, player_id: int, goal: Goal, difficulty: int,
+                 workers: int = 0) -> None:
+        """Initialize this SmartPlayer, which assesses <difficulty> moves each
+        turn, spread over <workers> processes if <workers> is not 0.
+        """
         # TODO: Implement Me
+        Player.__init__(self, player_id, goal)
         self._proceed = False
+        self._difficulty = difficulty
+        self._workers = workers
+        self._pool = None
 
     def get_selected_block(self, board: Block) -> Optional[Block]:
         return None
@@ -309,10 +345,439 @@ class SmartPlayer(Player):
         if not self._proceed:
             return None  # Do not remove
 
-        # TODO: Implement Me
+        # All the candidates are drawn before any is tried, each with its own
+        # seed for the random numbers a smash uses, so the same moves get the
+        # same scores whichever process assesses them.
+        search = _search_board(board)
+        candidates = []
+        for _ in range(self._difficulty):
+            move = search.random_move(self.goal.colour)
+            if move is None:
+                break
+            candidates.append(_encode_candidate(search, move,
+                                                random.getrandbits(64)))
+
+        if self._workers == 0 or len(candidates) < 2:
+            scores = _assess(search, self.goal, candidates)
+        else:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self._workers)
+            scores = _assess_in_pool(self._pool, search, self.goal,
+                                     candidates, self._workers)
+
+        best = None
+        best_score = self.goal.score(search)
+        for i in range(len(candidates)):
+            if scores[i] > best_score:
+                best = candidates[i]
+                best_score = scores[i]
 
         self._proceed = False  # Must set to False before returning!
-        return None  # FIXME
+        if best is None:
+            return _create_move(PASS, board)
+        return best[0], best[1], _decode_block(board, best)
+
+    def close(self) -> None:
+        """Shut down the processes that assess this player's moves, if any
+        were started.
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+# helper
+def _search_board(board: Block) -> Block:
+    """Return <board> if it is a Block, or else a Block copy of it, such as
+    of a QuadtreeBlock, to make and undo moves on while choosing a move.
+    """
+    if isinstance(board, Block):
+        return board
+    return board.to_block()
+
+
+# helper
+def _encode_candidate(board: Block, move: Tuple[str, Optional[int], Block],
+                      seed: int) -> _Candidate:
+    """Return <move> on <board> as a candidate with <seed>.
+    """
+    x, y = move[2].position
+    root_x, root_y = board.position
+    return move[0], move[1], x - root_x, y - root_y, move[2].level, seed
+
+
+# helper
+def _decode_block(board: Block, candidate: _Candidate) -> Optional[Block]:
+    """Return the block of <board> that <candidate> is a move on, or None if
+    <board> has no block at its position and level.
+    """
+    root_x, root_y = board.position
+    block = board.locate((root_x + candidate[2], root_y + candidate[3]),
+                         candidate[4])
+    if block is None or block.level != candidate[4]:
+        return None
+    return block
+
+
+# helper
+def _make_candidate(board: Block, candidate: _Candidate,
+                    colour: Tuple[int, int, int]) -> bool:
+    """Make <candidate> on <board>, painting <colour> if it is a paint move,
+    and return whether the move was made.
+
+    Any random numbers the move needs are drawn from the seed of <candidate>,
+    and the random module is left in the state it was in before.
+    """
+    block = _decode_block(board, candidate)
+    if block is None:
+        return False
+
+    state = random.getstate()
+    random.seed(candidate[5])
+    made = _make_move((candidate[0], candidate[1], block), colour)
+    random.setstate(state)
+
+    return made
+
+
+# helper
+def _assess(board: Block, goal: Goal, candidates: List[_Candidate]) -> \
+        List[int]:
+    """Return the score for <goal> on <board> after each move in <candidates>
+    alone, in the same order. <board> is left as it was.
+
+    Each candidate is made on <board> itself and then undone, which touches
+    only the Blocks the move changed. The goal is scored from the summaries
+    cached in the tree, which are turned on for <board> here, so only the
+    changed region is scored again. The index
+    of moves on <board> is held meanwhile, so that random_move makes the same
+    choices afterwards as if the candidates had been assessed in another
+    process.
+    """
+    board.cache_summaries()
+    if isinstance(goal, BlobGoal):
+        track_blobs(board)
+    recording = board.recording()
+    if not recording:
+        board.start_journal()
+
+    board.hold_moves()
+    scores = []
+    for candidate in candidates:
+        made = _make_candidate(board, candidate, goal.colour)
+        scores.append(goal.score(board))
+        if made:
+            board.undo()
+    board.release_moves()
+
+    if not recording:
+        board.stop_journal()
+
+    return scores
+
+
+# helper
+def _assess_in_pool(pool: ProcessPoolExecutor, board: Block, goal: Goal,
+                    candidates: List[_Candidate], workers: int) -> List[int]:
+    """Return the same scores as _assess(board, goal, candidates), worked out
+    by the <workers> processes of <pool>.
+
+    Each process is sent <board>, encoded by Block.to_bytes, and PALETTE,
+    which may have gained colours since the process started, together with
+    one slice of <candidates>. The slices are put back together in order, so
+    the scores do not depend on which process finishes first.
+    """
+    workers = min(workers, len(candidates))
+    step = -(-len(candidates) // workers)
+    data = board.to_bytes()
+    palette = PALETTE[:]
+    futures = [pool.submit(_assess_slice, data, palette, goal,
+                           candidates[i:i + step])
+               for i in range(0, len(candidates), step)]
+    scores = []
+    for future in futures:
+        scores.extend(future.result())
+
+    return scores
+
+
+# helper
+def _assess_slice(data: bytes, palette: List[Tuple[int, int, int]],
+                  goal: Goal, candidates: List[_Candidate]) -> List[int]:
+    """Return _assess for <goal> and <candidates> on the board encoded in
+    <data> with the colours in <palette>.
+
+    Decoding the board adds any colours of <palette> this process has not
+    seen to its own PALETTE, in the same order, so the colour of <goal> and
+    the colours its moves paint mean the same here as in the process that
+    sent them.
+    """
+    return _assess(Block.from_bytes(data, palette), goal, candidates)
+
+
+class MCTSPlayer(Player):
+    """A player that chooses its moves by Monte Carlo tree search.
+
+    Each turn, the player grows a tree of its own possible moves for as long
+    as its budget allows. Each round of the search picks a path down the
+    tree by UCT, adds one new move to it, and then makes a few random moves.
+    The round's reward is the player's score at the end, minus the penalties
+    in ACTION_PENALTY for every move along the way. The player makes the
+    move at the root that was tried most often, or passes if that is best.
+
+    If the board looks the same at the start of the next turn as it did
+    after that move, which is always the case when the other players pass,
+    the part of the tree below the move is kept and the search goes on from
+    there.
+    """
+    # === Private Attributes ===
+    # _proceed:
+    #   True when the player should make a move, False when the player should
+    #   wait.
+    # _node_limit:
+    #   The number of rounds of search each turn, or None for no limit.
+    # _time_limit:
+    #   The number of seconds of search each turn, or None for no limit.
+    # _playout_length:
+    #   The number of random moves made after the new move in each round.
+    # _tree:
+    #   The node for the move this player chose on its last turn, or None.
+    # _scale:
+    #   The largest absolute reward seen so far, which scales the exploration
+    #   term of UCT to the size of the rewards.
+    #
+    # == Representation Invariants concerning the private attributes ==
+    #     _node_limit is not None or _time_limit is not None
+    _proceed: bool
+    _node_limit: Optional[int]
+    _time_limit: Optional[float]
+    _playout_length: int
+    _tree: Optional[_SearchNode]
+    _scale: float
+
+    def __init__(self, player_id: int, goal: Goal,
+                 node_limit: Optional[int] = 500,
+                 time_limit: Optional[float] = None,
+                 playout_length: int = 1) -> None:
+        """Initialize this MCTSPlayer, which searches for <node_limit> rounds
+        or <time_limit> seconds each turn, whichever runs out first, making
+        <playout_length> random moves at the end of each round.
+
+        Precondition: node_limit is not None or time_limit is not None
+        """
+        Player.__init__(self, player_id, goal)
+        self._proceed = False
+        self._node_limit = node_limit
+        self._time_limit = time_limit
+        self._playout_length = playout_length
+        self._tree = None
+        self._scale = 1.0
+
+    def get_selected_block(self, board: Block) -> Optional[Block]:
+        return None
+
+    def process_event(self, event: pygame.event.Event) -> None:
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            self._proceed = True
+
+    def generate_move(self, board: Block) -> \
+            Optional[Tuple[str, Optional[int], Block]]:
+        """Return the move at the root of the search tree that was tried most
+        often, which is PASS if passing did best.
+
+        The moves of the search are made on <board> itself, or on a Block
+        copy of it if it is not a Block, and undone at the end of each round,
+        so this function does not mutate <board>.
+        """
+        if not self._proceed:
+            return None  # Do not remove
+
+        search = _search_board(board)
+        root = self._tree
+        if root is None or root.key != search.subtree_hash():
+            root = _SearchNode(None, search.subtree_hash(), 0)
+        elif root.untried is not None:
+            # The node kept was below the root last turn, where passing is
+            # not a move, so its moves were listed without a PASS.
+            root.untried.insert(0, _PASS_CANDIDATE)
+
+        search.cache_summaries()
+        if isinstance(self.goal, BlobGoal):
+            track_blobs(search)
+        recording = search.recording()
+        if not recording:
+            search.start_journal()
+
+        if self._time_limit is not None:
+            deadline = time.perf_counter() + self._time_limit
+        rounds = 0
+        while (self._node_limit is None or rounds < self._node_limit) and \
+                (self._time_limit is None or time.perf_counter() < deadline):
+            self._search(search, root)
+            rounds += 1
+
+        if not recording:
+            search.stop_journal()
+
+        self._proceed = False  # Must set to False before returning!
+        if root.children == []:
+            self._tree = None
+            return _create_move(PASS, board)
+        best = max(root.children, key=lambda child: child.visits)
+        self._tree = best
+        if best.move[0] == PASS[0]:
+            return _create_move(PASS, board)
+        return best.move[0], best.move[1], _decode_block(board, best.move)
+
+    def _search(self, board: Block, root: _SearchNode) -> None:
+        """Do one round of the search from <root>, which is the node for
+        <board>, and leave <board> as it was.
+        """
+        colour = self.goal.colour
+        path = [root]
+        node = root
+        made = 0
+        penalty = 0
+        playout = True
+        while True:
+            if node.untried is None:
+                node.untried = _untried_moves(board, colour, node is root)
+            if node.untried != []:
+                move = node.untried.pop()
+                if move[0] == PASS[0]:
+                    child = _SearchNode(move, node.key, 0)
+                    playout = False
+                elif _make_search_move(board, move, colour):
+                    made += 1
+                    child = _SearchNode(move, board.subtree_hash(),
+                                        ACTION_PENALTY[(move[0], move[1])])
+                else:
+                    break
+                node.children.append(child)
+                path.append(child)
+                penalty += child.penalty
+                break
+            elif node.children == []:
+                break
+
+            node = self._select(node)
+            path.append(node)
+            if node.move[0] == PASS[0]:
+                playout = False
+                break
+            if not _make_search_move(board, node.move, colour):
+                break
+            made += 1
+            penalty += node.penalty
+
+        # The player can pass whenever it likes, so a playout is worth the
+        # best reward at any point along it.
+        reward = self.goal.score(board) - penalty
+        for _ in range(self._playout_length if playout else 0):
+            move = board.random_move(colour)
+            if move is None or not _make_move(move, colour):
+                break
+            made += 1
+            penalty += ACTION_PENALTY[(move[0], move[1])]
+            reward = max(reward, self.goal.score(board) - penalty)
+        for _ in range(made):
+            board.undo()
+
+        self._scale = max(self._scale, abs(reward))
+        for node in path:
+            node.visits += 1
+            node.total += reward
+
+    def _select(self, node: _SearchNode) -> _SearchNode:
+        """Return the child of <node> with the highest UCT value.
+
+        Precondition: node.children != []
+        """
+        log_visits = math.log(node.visits)
+        exploration = math.sqrt(2) * self._scale
+        best = None
+        best_value = 0.0
+        for child in node.children:
+            value = child.total / child.visits + \
+                exploration * math.sqrt(log_visits / child.visits)
+            if best is None or value > best_value:
+                best = child
+                best_value = value
+
+        return best
+
+
+class _SearchNode:
+    """A position in the search tree of an MCTSPlayer.
+
+    === Public Attributes ===
+    move:
+        The move that leads to this position from the position of its
+        parent, in the form SmartPlayer sends to another process, or None for
+        the root. A smash has a new result each time it is made, so the
+        position below a smash is one of many, and the value of the node is
+        the average over them.
+    key:
+        The subtree_hash of the board in this position.
+    penalty:
+        The penalty for <move>.
+    children:
+        The nodes for the moves tried from this position.
+    untried:
+        The moves from this position that have not been tried yet, or None
+        if they have not been listed yet.
+    visits:
+        The number of rounds of the search that passed through this node.
+    total:
+        The sum of the rewards of those rounds.
+    """
+    move: Optional[_Candidate]
+    key: int
+    penalty: int
+    children: List[_SearchNode]
+    untried: Optional[List[_Candidate]]
+    visits: int
+    total: float
+
+    def __init__(self, move: Optional[_Candidate], key: int,
+                 penalty: int) -> None:
+        """Initialize a node that has not been visited yet.
+        """
+        self.move = move
+        self.key = key
+        self.penalty = penalty
+        self.children = []
+        self.untried = None
+        self.visits = 0
+        self.total = 0.0
+
+
+# helper
+def _make_search_move(board: Block, move: _Candidate,
+                      colour: Tuple[int, int, int]) -> bool:
+    """Make <move> on <board> for an MCTSPlayer, painting <colour> if it is a
+    paint move, and return whether the move was made.
+
+    The move may come from a different result of a smash higher up in the
+    search tree, so it is not made if <board> has no block where it was.
+    """
+    block = _decode_block(board, move)
+    return block is not None and _make_move((move[0], move[1], block), colour)
+
+
+# helper
+def _untried_moves(board: Block, colour: Tuple[int, int, int],
+                   can_pass: bool) -> List[_Candidate]:
+    """Return the moves of Block.valid_moves on <board> as candidates, in
+    random order, with a PASS first if <can_pass>.
+    """
+    moves = [_encode_candidate(board, move, 0)
+             for move in board.valid_moves(colour)]
+    random.shuffle(moves)
+    if can_pass:
+        moves.insert(0, _PASS_CANDIDATE)
+
+    return moves
 
 
 if __name__ == '__main__':
@@ -322,7 +787,8 @@ if __name__ == '__main__':
         'allowed-io': ['process_event'],
         'allowed-import-modules': [
             'doctest', 'python_ta', 'random', 'typing', 'actions', 'block',
-            'goal', 'pygame', '__future__'
+            'goal', 'pygame', '__future__', 'concurrent.futures', 'math',
+            'time', 'settings'
         ],
         'max-attributes': 10,
         'generated-members': 'pygame.*'
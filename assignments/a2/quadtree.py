@@ -0,0 +1,837 @@
+"""CSC148 Assignment 2
+
+=== CSC148 Winter 2020 ===
+Department of Computer Science,
+University of Toronto
+
+This code is provided solely for the personal and private use of
+students taking the CSC148 course at the University of Toronto.
+Copying for purposes other than this use is expressly prohibited.
+All forms of distribution of this code, whether as given or with
+any changes, are expressly prohibited.
+
+Authors: Diane Horton, David Liu, Mario Badr, Sophia Huynh, Misha Schwartz,
+and Jaisie Sin
+
+All of the files in this directory and all subdirectories are:
+Copyright (c) Diane Horton, David Liu, Mario Badr, Sophia Huynh,
+Misha Schwartz, and Jaisie Sin
+
+=== Module Description ===
+
+This file contains LinearQuadtree, an alternative board engine that stores the
+whole tree in flat parallel arrays instead of one Python object per node, and
+QuadtreeBlock, a thin view that lets the rest of the game use a node of a
+LinearQuadtree wherever it would use a Block.
+"""
+from __future__ import annotations
+from array import array
+from typing import Any, List, Optional, Tuple
+import random
+import math
+
+from block import Block, BlockBase, _versions
+from settings import colour_name, colour_index, COLOUR_LIST, PALETTE
+
+# The four children of a node are stored next to each other, in Morton (Z)
+# order: upper-left, upper-right, lower-left, lower-right. Block orders its
+# children upper-right, upper-left, lower-left, lower-right, so child <i> of a
+# Block lives in slot _MORTON[i] of its group. The mapping is its own inverse.
+_MORTON = (1, 0, 2, 3)
+
+# No colour, used for nodes that have children.
+_NO_COLOUR = -1
+# No children, used for leaves.
+_NO_CHILDREN = -1
+
+
+def generate_linear_board(max_depth: int, size: int,
+                          rng: Optional[random.Random] = None) \
+        -> QuadtreeBlock:
+    """Return a new game board with a depth of <max_depth> and dimensions of
+    <size> by <size>, stored in a LinearQuadtree.
+
+    Random numbers are drawn from <rng>, or from the random module if <rng> is
+    None, in the same order as block.generate_board. Both functions therefore
+    build the same board from the same random seed.
+
+    >>> board = generate_linear_board(3, 750)
+    >>> board.max_depth
+    3
+    >>> board.size
+    750
+    >>> len(board.children) == 4
+    True
+    """
+    choice = random.choice if rng is None else rng.choice
+    tree = LinearQuadtree(size, max_depth,
+                          colour_index(choice(COLOUR_LIST)))
+    tree.smash(0, rng)
+
+    return tree.root()
+
+
+def generate_seeded_boards(count: int, max_depth: int, size: int,
+                           seed: int = 0, as_blocks: bool = False) -> \
+        List[Any]:
+    """Return <count> new game boards with a depth of <max_depth> and
+    dimensions of <size> by <size>.
+
+    The boards are built one after another by generate_linear_board, drawing
+    their random numbers as it does. Board i is generated from its own
+    random.Random(<seed> + i), so any one of them can be regenerated on its
+    own with generate_linear_board, and it is the same board
+    block.generate_board builds after random.seed(<seed> + i).
+    The global random state is left untouched.
+
+    The boards are returned as QuadtreeBlock views of their LinearQuadtrees,
+    or as Blocks if <as_blocks> is True.
+
+    >>> boards = generate_seeded_boards(3, 2, 750, seed=10)
+    >>> boards[1] == generate_linear_board(2, 750, random.Random(11))
+    True
+    >>> board = generate_seeded_boards(1, 2, 750, 11, True)[0]
+    >>> board == boards[1].tree.to_block()
+    True
+    """
+    boards = []
+    for i in range(count):
+        board = generate_linear_board(max_depth, size,
+                                      random.Random(seed + i))
+        if as_blocks:
+            boards.append(board.tree.to_block())
+        else:
+            boards.append(board)
+
+    return boards
+
+
+class LinearQuadtree:
+    """A Blocky board stored as a linear quadtree.
+
+    Node 0 is the root. Every other node belongs to a group of four siblings
+    that occupy consecutive indices in Morton order, and the tree is held in
+    a few flat arrays rather than one object per node. Smashes, swaps and
+    rotates leave the groups wherever they happen to be in the arrays, so
+    only a tree made by compact() has them in depth-first order.
+
+    The root is usually a whole board, at level 0 and position (0, 0), but a
+    tree copied from part of a board keeps the level and position that part
+    had, as Block.create_copy does.
+
+    === Public Attributes ===
+    size:
+        The height and width of the root, in pixels.
+    position:
+        The (x, y) coordinates of the upper left corner of the root.
+    max_depth:
+        The deepest level allowed in the tree.
+    colours:
+        colours[i] is the index in settings.PALETTE of the colour of node i,
+        or -1 if node i has children.
+    levels:
+        levels[i] is the level of node i.
+    child_offsets:
+        child_offsets[i] is the index of the first node in the group of
+        children of node i, or -1 if node i is a leaf.
+    parents:
+        parents[i] is the index of the parent of node i, or -1 for the root.
+    version:
+        A number that identifies what the tree looks like now, drawn from the
+        same sequence as Block.version, so that no tree or Block ever shares
+        a version with another.
+
+    === Representation Invariants ===
+    - len(colours) == len(levels) == len(child_offsets) == len(parents)
+    - child_offsets[i] == -1 iff colours[i] != -1, for every node i in use
+    - The children of node i are at child_offsets[i] + _MORTON[0..3], and
+      their level is levels[i] + 1.
+    """
+    # === Private Attributes ===
+    # _free:
+    #   The first index of each group of four nodes that is no longer in use
+    #   because its parent was combined. Smashing reuses these groups.
+    # _sizes:
+    #   _sizes[level] is the size in pixels of a node at <level>.
+    size: int
+    position: Tuple[int, int]
+    max_depth: int
+    colours: array
+    levels: array
+    child_offsets: array
+    parents: array
+    version: int
+    _free: List[int]
+    _sizes: List[int]
+
+    def __init__(self, size: int, max_depth: int, colour: int,
+                 level: int = 0, position: Tuple[int, int] = (0, 0)) -> None:
+        """Initialize this tree to be a single leaf of dimensions <size> by
+        <size> whose colour is PALETTE[<colour>], at <level> and with its
+        upper left corner at <position>.
+
+        Preconditions:
+            - size > 0
+            - 0 <= level <= max_depth
+            - 0 <= colour < len(PALETTE)
+        """
+        self.size = size
+        self.position = position
+        self.max_depth = max_depth
+        self.colours = array('b', [colour])
+        self.levels = array('B', [level])
+        self.child_offsets = array('i', [_NO_CHILDREN])
+        self.parents = array('i', [-1])
+        self.version = next(_versions)
+        self._free = []
+
+        # No node is above the root, so the levels before it are never read.
+        self._sizes = [size] * (level + 1)
+        for _ in range(level, max_depth):
+            self._sizes.append(round(self._sizes[-1] / 2.0))
+
+    @staticmethod
+    def from_block(block: Block) -> LinearQuadtree:
+        """Return a new LinearQuadtree that stores the same tree as <block>.
+
+        The new tree's root corresponds to <block>, and has the same level,
+        position and max_depth as <block>.
+        """
+        tree = LinearQuadtree(block.size, block.max_depth, 0, block.level,
+                              block.position)
+        tree._copy_from_block(0, block)
+
+        return tree
+
+    def _copy_from_block(self, node: int, block: Block) -> None:
+        """Copy <block> and its descendants into <node>, which has already been
+        allocated.
+        """
+        if len(block.children) == 0:
+            self.colours[node] = colour_index(block.colour)
+            return
+
+        first = self._allocate_group(node)
+        for i in range(4):
+            self._copy_from_block(first + _MORTON[i], block.children[i])
+
+    def to_block(self, node: int = 0) -> Block:
+        """Return a new Block that is a deep copy of the subtree rooted at
+        <node>, which is the whole tree by default.
+        """
+        return self._to_block(node, self.node_position(node))
+
+    def _to_block(self, node: int, position: Tuple[int, int]) -> Block:
+        """Return a new Block for the subtree rooted at <node>, with its upper
+        left corner at <position>.
+        """
+        level = self.levels[node]
+        block = Block(position, self._sizes[level], None, level,
+                      self.max_depth)
+
+        first = self.child_offsets[node]
+        if first == _NO_CHILDREN:
+            block.colour = PALETTE[self.colours[node]]
+        else:
+            positions = block._children_positions()
+            for i in range(4):
+                block.children.append(self._to_block(first + _MORTON[i],
+                                                      positions[i]))
+
+        return block
+
+    def root(self) -> QuadtreeBlock:
+        """Return a view of the root of this tree.
+        """
+        return QuadtreeBlock(self, 0)
+
+    def node_count(self) -> int:
+        """Return the number of nodes in use in this tree.
+        """
+        return len(self.colours) - 4 * len(self._free)
+
+    def node_size(self, node: int) -> int:
+        """Return the size in pixels of <node>.
+        """
+        return self._sizes[self.levels[node]]
+
+    def node_position(self, node: int) -> Tuple[int, int]:
+        """Return the (x, y) coordinates of the upper left corner of <node>.
+
+        The position is derived from the path from the root to <node>, so it is
+        always consistent with the tree's current shape.
+        """
+        x, y = self.position
+        parent = self.parents[node]
+        while parent != -1:
+            slot = node - self.child_offsets[parent]
+            offset = self._sizes[self.levels[node]]
+            if slot == 1 or slot == 3:
+                x += offset
+            if slot == 2 or slot == 3:
+                y += offset
+            node = parent
+            parent = self.parents[node]
+
+        return x, y
+
+    def child(self, node: int, index: int) -> int:
+        """Return the node that is child <index> of <node>, where children are
+        numbered in the same order as Block.children.
+
+        Precondition: <node> has children.
+        """
+        return self.child_offsets[node] + _MORTON[index]
+
+    def is_leaf(self, node: int) -> bool:
+        """Return True iff <node> has no children.
+        """
+        return self.child_offsets[node] == _NO_CHILDREN
+
+    def unit_cells(self, node: int = 0) -> List[bytearray]:
+        """Return the unit cells of the subtree rooted at <node>, in the format
+        of Block.unit_cells.
+        """
+        width = 2 ** (self.max_depth - self.levels[node])
+        cells = [bytearray(width) for _ in range(width)]
+        stack = [(node, 0, 0, width)]
+        while stack:
+            current, column, row, width = stack.pop()
+            first = self.child_offsets[current]
+            if first == _NO_CHILDREN:
+                colours = bytes((self.colours[current],)) * width
+                for i in range(column, column + width):
+                    cells[i][row:row + width] = colours
+            else:
+                half = width // 2
+                stack.append((first, column, row, half))
+                stack.append((first + 1, column + half, row, half))
+                stack.append((first + 2, column, row + half, half))
+                stack.append((first + 3, column + half, row + half, half))
+
+        return cells
+
+    def leaves(self, node: int = 0) -> List[int]:
+        """Return the leaves of the subtree rooted at <node>, in Morton order.
+        """
+        result = []
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            first = self.child_offsets[current]
+            if first == _NO_CHILDREN:
+                result.append(current)
+            else:
+                stack.extend(range(first + 3, first - 1, -1))
+
+        return result
+
+    def _append(self, colour: int, level: int, parent: int) -> int:
+        """Append a new leaf to the arrays and return its index.
+        """
+        self.colours.append(colour)
+        self.levels.append(level)
+        self.child_offsets.append(_NO_CHILDREN)
+        self.parents.append(parent)
+        return len(self.colours) - 1
+
+    def _allocate_group(self, node: int) -> int:
+        """Give <node> a group of four uncoloured children and return the index
+        of the first of them.
+
+        A group freed by combine is reused if there is one.
+        """
+        level = self.levels[node] + 1
+        if self._free:
+            first = self._free.pop()
+            for i in range(first, first + 4):
+                self.colours[i] = _NO_COLOUR
+                self.levels[i] = level
+                self.child_offsets[i] = _NO_CHILDREN
+                self.parents[i] = node
+        else:
+            first = self._append(_NO_COLOUR, level, node)
+            for _ in range(3):
+                self._append(_NO_COLOUR, level, node)
+
+        self.colours[node] = _NO_COLOUR
+        self.child_offsets[node] = first
+        return first
+
+    def smashable(self, node: int) -> bool:
+        """Return True iff <node> can be smashed.
+        """
+        return self.levels[node] != self.max_depth and \
+            self.child_offsets[node] == _NO_CHILDREN
+
+    def smash(self, node: int, rng: Optional[random.Random] = None) -> bool:
+        """Sub-divide <node> into four randomly generated children, as
+        Block.smash does.
+
+        Random numbers are drawn from <rng>, or from the random module if <rng>
+        is None, in the same order as Block.smash draws them.
+
+        Return True iff the smash was performed.
+        """
+        if not self.smashable(node):
+            return False
+
+        if rng is None:
+            draw, choice = random.random, random.choice
+        else:
+            draw, choice = rng.random, rng.choice
+        indices = [colour_index(colour) for colour in COLOUR_LIST]
+        probabilities = [math.exp(-0.25 * (level + 1))
+                         for level in range(self.max_depth)]
+
+        # Block.smash recurses into child i right after its draw, before
+        # child i + 1 draws. Each stack entry records which child of a group
+        # draws next, so the loop below follows exactly the same order.
+        stack = [(self._allocate_group(node), self.levels[node], 0)]
+        self._colour_group(stack[0][0], choice, indices)
+        while stack:
+            first, level, i = stack.pop()
+            if i < 3:
+                stack.append((first, level, i + 1))
+            if draw() < probabilities[level] and level + 1 < self.max_depth:
+                child = self._allocate_group(first + _MORTON[i])
+                self._colour_group(child, choice, indices)
+                stack.append((child, level + 1, 0))
+
+        self.version = next(_versions)
+        return True
+
+    def _colour_group(self, first: int, choice: Any,
+                      indices: List[int]) -> None:
+        """Give each node in the group starting at <first> a colour picked by
+        <choice> from <indices>, in the order of Block.children.
+        """
+        for i in range(4):
+            self.colours[first + _MORTON[i]] = choice(indices)
+
+    def swap(self, node: int, direction: int) -> bool:
+        """Swap the children of <node> as Block.swap does.
+
+        Return True iff the swap was performed.
+
+        Precondition: <direction> is either 0 or 1
+        """
+        first = self.child_offsets[node]
+        if first == _NO_CHILDREN:
+            return False
+
+        if direction == 1:
+            self._exchange(first + _MORTON[0], first + _MORTON[3])
+            self._exchange(first + _MORTON[1], first + _MORTON[2])
+        else:
+            self._exchange(first + _MORTON[0], first + _MORTON[1])
+            self._exchange(first + _MORTON[2], first + _MORTON[3])
+
+        self.version = next(_versions)
+        return True
+
+    def rotate(self, node: int, direction: int) -> bool:
+        """Rotate <node> and all its descendants as Block.rotate does.
+
+        Return True iff the rotate was performed.
+
+        Precondition: <direction> is either 1 or 3.
+        """
+        first = self.child_offsets[node]
+        if first == _NO_CHILDREN:
+            return False
+
+        slots = [first + _MORTON[i] for i in range(4)]
+        if direction == 1:
+            # Block order 0, 1, 2, 3 becomes 1, 2, 3, 0.
+            self._exchange(slots[0], slots[1])
+            self._exchange(slots[1], slots[2])
+            self._exchange(slots[2], slots[3])
+        else:
+            # Block order 0, 1, 2, 3 becomes 3, 0, 1, 2.
+            self._exchange(slots[2], slots[3])
+            self._exchange(slots[1], slots[2])
+            self._exchange(slots[0], slots[1])
+
+        for slot in slots:
+            self.rotate(slot, direction)
+
+        self.version = next(_versions)
+        return True
+
+    def _exchange(self, a: int, b: int) -> None:
+        """Exchange the siblings at <a> and <b>, along with their subtrees.
+        """
+        self.colours[a], self.colours[b] = self.colours[b], self.colours[a]
+        first_a = self.child_offsets[a]
+        first_b = self.child_offsets[b]
+        self.child_offsets[a] = first_b
+        self.child_offsets[b] = first_a
+        if first_b != _NO_CHILDREN:
+            for i in range(first_b, first_b + 4):
+                self.parents[i] = a
+        if first_a != _NO_CHILDREN:
+            for i in range(first_a, first_a + 4):
+                self.parents[i] = b
+
+    def paint(self, node: int, colour: int) -> bool:
+        """Change the colour of <node> to PALETTE[<colour>] iff it is a
+        leaf at max_depth and its colour is different.
+
+        Return True iff the colour was changed.
+        """
+        if self.levels[node] == self.max_depth and \
+                self.colours[node] != colour:
+            self.colours[node] = colour
+            self.version = next(_versions)
+            return True
+
+        return False
+
+    def combine(self, node: int) -> bool:
+        """Turn <node> into a leaf based on the majority colour of its
+        children, as Block.combine does.
+
+        Return True iff <node> was turned into a leaf.
+        """
+        first = self.child_offsets[node]
+        if self.levels[node] != self.max_depth - 1 or first == _NO_CHILDREN:
+            return False
+
+        colour = self.majority_colour(node)
+        if colour is None:
+            return False
+
+        self.colours[node] = colour
+        self.child_offsets[node] = _NO_CHILDREN
+        for i in range(first, first + 4):
+            self.parents[i] = -1
+        self._free.append(first)
+        self.version = next(_versions)
+        return True
+
+    def majority_colour(self, node: int) -> Optional[int]:
+        """Return the index of the colour that more of the children of <node>
+        have than any other, or None if there is a tie or <node> is a leaf.
+
+        Children that have children of their own count as having no colour.
+        """
+        first = self.child_offsets[node]
+        if first == _NO_CHILDREN:
+            return None
+
+        counts = {}
+        for i in range(first, first + 4):
+            counts[self.colours[i]] = counts.get(self.colours[i], 0) + 1
+        best = max(counts.values())
+        winners = [c for c in counts if counts[c] == best]
+        if len(winners) != 1:
+            return None
+        return winners[0]
+
+    def one_colour(self, node: int) -> Optional[int]:
+        """Return the index of the colour of every unit cell of the subtree at
+        <node>, or None if they are not all the same colour.
+        """
+        colour = None
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            first = self.child_offsets[current]
+            if first != _NO_CHILDREN:
+                stack.extend(range(first, first + 4))
+            elif colour is None:
+                colour = self.colours[current]
+            elif self.colours[current] != colour:
+                return None
+
+        return colour
+
+    def copy(self) -> LinearQuadtree:
+        """Return a copy of this tree that shares no arrays with it.
+        """
+        tree = LinearQuadtree(self.size, self.max_depth, 0, self.levels[0],
+                              self.position)
+        tree.colours = array('b', self.colours)
+        tree.levels = array('B', self.levels)
+        tree.child_offsets = array('i', self.child_offsets)
+        tree.parents = array('i', self.parents)
+        tree._free = self._free[:]
+        return tree
+
+    def compact(self, node: int = 0) -> LinearQuadtree:
+        """Return a new tree holding the subtree rooted at <node>, with groups
+        laid out depth first in Morton order and without unused groups. Its
+        root keeps the level and position of <node>.
+        """
+        tree = LinearQuadtree(self._sizes[self.levels[node]], self.max_depth,
+                              0, self.levels[node], self.node_position(node))
+        tree.colours[0] = self.colours[node]
+        tree._compact_from(self, node, 0)
+
+        return tree
+
+    def _compact_from(self, source: LinearQuadtree, source_node: int,
+                      node: int) -> None:
+        """Copy the descendants of <source_node> in <source> below <node>.
+        """
+        source_first = source.child_offsets[source_node]
+        if source_first == _NO_CHILDREN:
+            return
+
+        first = self._allocate_group(node)
+        for slot in range(4):
+            self.colours[first + slot] = source.colours[source_first + slot]
+        for slot in range(4):
+            self._compact_from(source, source_first + slot, first + slot)
+
+    def subtree_equal(self, node: int, other: LinearQuadtree,
+                      other_node: int) -> bool:
+        """Return True iff the subtree at <node> has the same shape and
+        colours as the subtree at <other_node> in <other>.
+        """
+        stack = [(node, other_node)]
+        while stack:
+            a, b = stack.pop()
+            first_a = self.child_offsets[a]
+            first_b = other.child_offsets[b]
+            if (first_a == _NO_CHILDREN) != (first_b == _NO_CHILDREN):
+                return False
+            if first_a == _NO_CHILDREN:
+                if self.colours[a] != other.colours[b]:
+                    return False
+            else:
+                for slot in range(4):
+                    stack.append((first_a + slot, first_b + slot))
+
+        return True
+
+
+class QuadtreeBlock(BlockBase):
+    """A view of one node of a LinearQuadtree that behaves like a Block.
+
+    A QuadtreeBlock has the same public attributes and methods as Block, and
+    can be passed to the goals, the players and the game states in place of
+    one. It stores no tree data of its own: every attribute is read from, and
+    every action is applied to, the underlying LinearQuadtree. locate,
+    locate_all, valid_moves and random_move are the ones in BlockBase, which
+    read the tree through the helpers at the end of this class.
+
+    A QuadtreeBlock refers to a place in the tree rather than to a particular
+    node, so after a swap or rotate of one of its ancestors it shows whichever
+    node was moved into that place.
+
+    === Public Attributes ===
+    tree:
+        The LinearQuadtree this view reads from.
+    node:
+        The index of the node in <tree> that this view shows.
+    """
+    tree: LinearQuadtree
+    node: int
+
+    def __init__(self, tree: LinearQuadtree, node: int) -> None:
+        """Initialize this view of <node> in <tree>.
+        """
+        self.tree = tree
+        self.node = node
+
+    @property
+    def position(self) -> Tuple[int, int]:
+        """The (x, y) coordinates of the upper left corner of this block.
+        """
+        return self.tree.node_position(self.node)
+
+    @property
+    def size(self) -> int:
+        """The height and width of this square block.
+        """
+        return self.tree.node_size(self.node)
+
+    @property
+    def colour(self) -> Optional[Tuple[int, int, int]]:
+        """The colour of this block, or None if it has children.
+        """
+        colour = self.tree.colours[self.node]
+        if colour == _NO_COLOUR:
+            return None
+        return PALETTE[colour]
+
+    @property
+    def level(self) -> int:
+        """The level of this block within the tree.
+        """
+        return self.tree.levels[self.node]
+
+    @property
+    def max_depth(self) -> int:
+        """The deepest level allowed in the tree.
+        """
+        return self.tree.max_depth
+
+    @property
+    def children(self) -> List[QuadtreeBlock]:
+        """Views of the children of this block, in the same order as
+        Block.children.
+        """
+        first = self.tree.child_offsets[self.node]
+        if first == _NO_CHILDREN:
+            return []
+        return [QuadtreeBlock(self.tree, first + _MORTON[i])
+                for i in range(4)]
+
+    def __str__(self) -> str:
+        """Return this block in the same string format as Block.
+        """
+        indents = '\t' * self.level
+        if self.tree.is_leaf(self.node):
+            colour = colour_name(self.colour)
+            return f'{indents}Leaf: colour={colour}, pos={self.position}, ' \
+                   f'size={self.size}, level={self.level}\n'
+
+        result = f'{indents}Parent: pos={self.position},' \
+                 f'size={self.size}, level={self.level}\n'
+        for child in self.children:
+            result += str(child)
+        return result
+
+    def __eq__(self, other: Any) -> bool:
+        """Return True iff this block and all its descendants are equivalent
+        to <other> and all its descendants.
+
+        <other> may be a Block or another QuadtreeBlock.
+        """
+        if isinstance(other, QuadtreeBlock):
+            return self.position == other.position and \
+                self.level == other.level and \
+                self.max_depth == other.max_depth and \
+                self.size == other.size and \
+                self.tree.subtree_equal(self.node, other.tree, other.node)
+
+        if len(self.children) == 0 and len(other.children) == 0:
+            return self.position == other.position and \
+                self.size == other.size and \
+                self.colour == other.colour and \
+                self.level == other.level and \
+                self.max_depth == other.max_depth
+        elif len(self.children) != len(other.children):
+            return False
+        else:
+            for child, other_child in zip(self.children, other.children):
+                if not child == other_child:
+                    return False
+            return True
+
+    def unit_cells(self) -> List[bytearray]:
+        """Return the unit cells of this block, in the format of
+        Block.unit_cells.
+        """
+        return self.tree.unit_cells(self.node)
+
+    def _child_size(self) -> int:
+        """Return the size of this block's children.
+        """
+        return round(self.size / 2.0)
+
+    def _children_positions(self) -> List[Tuple[int, int]]:
+        """Return the positions of this block's four children, in the same
+        order as Block._children_positions.
+        """
+        x, y = self.position
+        size = self._child_size()
+
+        return [(x + size, y), (x, y), (x, y + size), (x + size, y + size)]
+
+    def smashable(self) -> bool:
+        """Return True iff this block can be smashed.
+        """
+        return self.tree.smashable(self.node)
+
+    def smash(self) -> bool:
+        """Sub-divide this block into four randomly generated children.
+
+        Return True iff the smash was performed.
+        """
+        return self.tree.smash(self.node)
+
+    def swap(self, direction: int) -> bool:
+        """Swap the child blocks of this block.
+
+        Return True iff the swap was performed.
+        """
+        return self.tree.swap(self.node, direction)
+
+    def rotate(self, direction: int) -> bool:
+        """Rotate this block and all its descendants.
+
+        Return True iff the rotate was performed.
+        """
+        return self.tree.rotate(self.node, direction)
+
+    def paint(self, colour: Tuple[int, int, int]) -> bool:
+        """Change this block's colour iff it is a leaf at a level of max_depth
+        and its colour is different from <colour>.
+
+        Return True iff this block's colour was changed.
+        """
+        return self.tree.paint(self.node, colour_index(colour))
+
+    def combine(self) -> bool:
+        """Turn this block into a leaf based on the majority colour of its
+        children.
+
+        Return True iff this block was turned into a leaf node.
+        """
+        return self.tree.combine(self.node)
+
+    def create_copy(self) -> QuadtreeBlock:
+        """Return a view of the root of a new tree that is a deep copy of this
+        block.
+        """
+        if self.node == 0:
+            return self.tree.copy().root()
+        return self.tree.compact(self.node).root()
+
+    def to_block(self) -> Block:
+        """Return a new Block that is a deep copy of this block.
+        """
+        return self.tree.to_block(self.node)
+
+    def version(self) -> int:
+        """Return a number that identifies what this board looks like now, as
+        Block.version does.
+        """
+        return self.tree.version
+
+    def _colour_key(self) -> int:
+        """Return the index in PALETTE of this leaf's colour.
+        """
+        return self.tree.colours[self.node]
+
+    def _one_colour(self) -> bool:
+        """Return True iff every unit cell of this block is the same colour.
+        """
+        return self.tree.one_colour(self.node) is not None
+
+    def _same_as(self, other: QuadtreeBlock) -> bool:
+        """Return True iff this block and <other> have the same unit cells.
+        """
+        return self.tree.subtree_equal(self.node, other.tree, other.node)
+
+    def _majority_key(self) -> Optional[int]:
+        """Return the index in PALETTE of the majority colour of this block's
+        children, or None if there is none.
+        """
+        return self.tree.majority_colour(self.node)
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'allowed-import-modules': [
+            'doctest', 'python_ta', 'random', 'typing', '__future__', 'math',
+            'array', 'block', 'settings'
+        ],
+        'max-attributes': 15
+    })
@@ -29,7 +29,7 @@ from actions import ROTATE_CLOCKWISE, ROTATE_COUNTER_CLOCKWISE,\
     PAINT, PASS
 from settings import BACKGROUND_COLOUR, TEXT_COLOUR, OUTLINE_THICKNESS, \
     OUTLINE_COLOUR, HIGHLIGHT_THICKNESS, HIGHLIGHT_COLOUR, COLOUR_LIST, \
-    colour_name
+    PALETTE, colour_name
 
 Y_FONT_PADDING = 2
 
@@ -214,6 +214,23 @@ class Renderer:
             pygame.draw.rect(self._screen, OUTLINE_COLOUR, rect,
                              OUTLINE_THICKNESS)
 
+    def draw_cells(self, cells: List[bytearray], pos: Tuple[int, int],
+                   size: int) -> None:
+        """Draw <cells>, a grid of colour indices in the format returned by
+        Block.unit_cells, as a <size> by <size> square at <pos>.
+
+        Unlike draw_board, no outlines are drawn.
+        """
+        width = len(cells)
+        # pygame expects rows, and <cells> is a list of columns.
+        pixels = bytearray(width * width)
+        for i in range(width):
+            pixels[i::width] = cells[i]
+        image = pygame.image.fromstring(bytes(pixels), (width, width), 'P')
+        image.set_palette(PALETTE)
+        image = pygame.transform.scale(image, (size, size))
+        self._screen.blit(image, pos)
+
     def highlight_block(self, pos: Tuple[int, int], size: int) -> None:
         """Draw a highlighted square border at pos with size.
         """
@@ -21,7 +21,7 @@ Misha Schwartz, and Jaisie Sin.
 
 This file contains the global settings for the blocky game.
 """
-from typing import Tuple
+from typing import Dict, List, Tuple
 
 # Colours that we could use in the game
 WHITE = (255, 255, 255)
@@ -36,6 +36,14 @@ TEMPTING_TURQUOISE = (75, 196, 213)
 # A pallette of the colours we use in the game
 COLOUR_LIST = [PACIFIC_POINT, REAL_RED, OLD_OLIVE, DAFFODIL_DELIGHT]
 
+# Every colour a block can have. Blocks store the index of their colour in
+# this list instead of the colour itself. It starts with the colours in
+# COLOUR_LIST, in the same order, and colour_index adds any other colour the
+# first time it is used. Grids of unit cells store these indices in single
+# bytes, so there can be at most MAX_COLOURS colours.
+MAX_COLOURS = 128
+PALETTE = COLOUR_LIST[:]
+
 # The game board will be a square with this size.
 BOARD_SIZE = 750
 
@@ -56,6 +64,23 @@ HIGHLIGHT_THICKNESS = 5
 ANIMATION_DURATION = 1
 
 
+# The name of each colour
+_COLOUR_NAMES = {
+    WHITE: 'White',
+    BLACK: 'Black',
+    PACIFIC_POINT: 'Pacific Point',
+    OLD_OLIVE: 'Old Olive',
+    REAL_RED: 'Real Red',
+    MELON_MAMBO: 'Melon Mambo',
+    DAFFODIL_DELIGHT: 'Daffodil Delight',
+    TEMPTING_TURQUOISE: 'Tempting Turquoise'
+}
+
+# The index of each colour in PALETTE
+_PALETTE_INDEX: Dict[Tuple[int, int, int], int] = \
+    {colour: i for i, colour in enumerate(PALETTE)}
+
+
 def colour_name(colour: Tuple[int, int, int]) -> str:
     """Return the colour name associated with this colour value, or the empty
     string if this colour value isn't in our colour list.
@@ -65,14 +90,34 @@ def colour_name(colour: Tuple[int, int, int]) -> str:
     >>> colour_name(PACIFIC_POINT)
     'Pacific Point'
     """
-    colour_names = {
-        PACIFIC_POINT: 'Pacific Point',
-        REAL_RED: 'Real Red',
-        OLD_OLIVE: 'Old Olive',
-        DAFFODIL_DELIGHT: 'Daffodil Delight'
-    }
-
-    if colour in colour_names:
-        return colour_names[colour]
+    if colour in _COLOUR_NAMES:
+        return _COLOUR_NAMES[colour]
     else:
         return ''
+
+
+def colour_index(colour: Tuple[int, int, int]) -> int:
+    """Return the index of <colour> in PALETTE, adding <colour> to the end of
+    PALETTE if it is not there yet.
+
+    Raise a ValueError if <colour> would be colour number MAX_COLOURS + 1.
+
+    >>> colour_index(PACIFIC_POINT)
+    0
+    """
+    if colour not in _PALETTE_INDEX:
+        if len(PALETTE) >= MAX_COLOURS:
+            raise ValueError(f'there can be at most {MAX_COLOURS} colours')
+        _PALETTE_INDEX[colour] = len(PALETTE)
+        PALETTE.append(colour)
+
+    return _PALETTE_INDEX[colour]
+
+
+def palette_colours(indices: List[int]) -> List[Tuple[int, int, int]]:
+    """Return the colour in PALETTE at each of <indices>.
+
+    >>> palette_colours([1, 0])
+    [(199, 44, 58), (1, 128, 181)]
+    """
+    return [PALETTE[i] for i in indices]